@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Flask-Dashed benchmarks
+-----------------------
+
+Measures list, search, form, dashboard and navigation hot paths against a
+SQLite database filled with generated rows of the example application
+models (companies, warehouses, users and profiles).
+
+Latency percentiles, SQL queries per request (from `Server-Timing`) and
+mean resident memory growth per request are reported for each scenario, as
+JSON suitable for comparison::
+
+    python benchmarks/run.py --rows 100000 --output bench.json
+    python benchmarks/run.py --rows 100000 --compare bench.json
+
+Generated databases are kept in the temporary directory by row count and
+reused across runs.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import re
+import resource
+import sqlite3
+import sys
+import tempfile
+from time import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import select
+from werkzeug import OrderedMultiDict
+from flask import Flask
+from flask.ext.sqlalchemy import SQLAlchemy
+from flask_dashed.admin import Admin
+from flask_dashed.ext.sqlalchemy import ModelAdminModule, model_form
+from flask_dashed.profiling import Profiler
+
+
+def build_app(database, modules=0):
+    """Returns example application, admin and models.
+
+    :param database: The SQLite database path
+    :param modules: The count of extra model modules to register
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'secret'
+    app.config['CSRF_ENABLED'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///%s' % database
+    db = SQLAlchemy(app)
+
+    class Company(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(255), unique=True, nullable=False)
+
+        def __unicode__(self):
+            return unicode(self.name)
+
+    class Warehouse(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(255), nullable=False)
+        company_id = db.Column(db.Integer, db.ForeignKey(Company.id),
+            index=True)
+        company = db.relationship(Company, backref=db.backref('warehouses'))
+
+    class User(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        username = db.Column(db.String(255), unique=True, nullable=False)
+        password = db.Column(db.String(255))
+        is_active = db.Column(db.Boolean())
+
+    class Profile(db.Model):
+        id = db.Column(db.Integer, db.ForeignKey(User.id), primary_key=True)
+        name = db.Column(db.String(255), nullable=False)
+        location = db.Column(db.String(255))
+        company_id = db.Column(db.Integer, db.ForeignKey(Company.id),
+            nullable=True, index=True)
+        user = db.relationship(User, backref=db.backref('profile',
+            uselist=False))
+        company = db.relationship(Company, backref=db.backref('staff'))
+
+    class CompanyModule(ModelAdminModule):
+        model = Company
+        db_session = db.session
+        searchable_fields = ['name']
+        form_class = model_form(Company, db.session, only=['name'])
+
+    class UserModule(ModelAdminModule):
+        model = User
+        db_session = db.session
+        searchable_fields = ['username']
+
+    class WarehouseModule(ModelAdminModule):
+        model = Warehouse
+        db_session = db.session
+        list_fields = OrderedMultiDict((
+            ('id', {'label': 'id', 'column': Warehouse.id}),
+            ('name', {'label': 'name', 'column': Warehouse.name}),
+            ('company.name', {'label': 'company', 'column': Company.name}),
+        ))
+
+    class ProfileModule(ModelAdminModule):
+        model = Profile
+        db_session = db.session
+        list_fields = OrderedMultiDict((
+            ('id', {'label': 'id', 'column': Profile.id}),
+            ('name', {'label': 'name', 'column': Profile.name}),
+            ('location', {'label': 'location', 'column': Profile.location}),
+            ('user.username', {'label': 'username',
+                'column': User.username}),
+            ('company.name', {'label': 'company', 'column': Company.name}),
+        ))
+        searchable_fields = ['name', 'location']
+
+    class KeysetProfileModule(ProfileModule):
+        list_pagination = 'keyset'
+
+    class ProjectedProfileModule(ProfileModule):
+        list_projection = True
+
+    admin = Admin(app)
+    Profiler(admin, engines=[db.get_engine(app)], panel=False)
+    companies = admin.register_module(CompanyModule, '/companies',
+        'companies', 'companies')
+    admin.register_module(WarehouseModule, '/warehouses', 'warehouses',
+        'warehouses', parent=companies)
+    admin.register_module(UserModule, '/users', 'users', 'users')
+    admin.register_module(ProfileModule, '/profiles', 'profiles',
+        'profiles')
+    admin.register_module(KeysetProfileModule, '/keyset-profiles',
+        'keyset_profiles', 'keyset profiles')
+    admin.register_module(ProjectedProfileModule, '/projected-profiles',
+        'projected_profiles', 'projected profiles')
+    for i in xrange(modules):
+        parent = admin.register_node('/section-%d' % i, 'section_%d' % i,
+            'section %d' % i) if not i % 10 else parent
+        admin.register_module(type('CompanyModule%d' % i, (CompanyModule,),
+            {}), '/module-%d' % i, 'module_%d' % i, 'module %d' % i,
+            parent=parent)
+    return app, db, admin, (Company, Warehouse, User, Profile)
+
+
+def populate(database, rows, batch_size=10000):
+    """Creates database filled with `rows` users, profiles and warehouses.
+
+    :param database: The SQLite database path
+    :param rows: The row count
+    :param batch_size: The insert batch size
+    """
+    app, db, admin, models = build_app(database)
+    Company, Warehouse, User, Profile = models
+    db.create_all()
+    engine = db.get_engine(app)
+    companies = max(rows // 100, 1)
+    engine.execute(Company.__table__.insert(), [{'id': i + 1,
+        'name': u'company %d' % i} for i in xrange(companies)])
+    random.seed(0)
+    for start in xrange(0, rows, batch_size):
+        ids = xrange(start + 1, min(start + batch_size, rows) + 1)
+        engine.execute(User.__table__.insert(), [{'id': i,
+            'username': u'user%d' % i, 'password': u'secret',
+            'is_active': i % 2 == 0} for i in ids])
+        engine.execute(Profile.__table__.insert(), [{'id': i,
+            'name': u'name %d' % i, 'location': random.choice((u'Paris',
+            u'Lyon', u'Nantes', u'Lille')), 'company_id':
+            random.randint(1, companies)} for i in ids])
+        engine.execute(Warehouse.__table__.insert(), [{'id': i,
+            'name': u'warehouse %d' % i,
+            'company_id': random.randint(1, companies)} for i in ids])
+    engine.dispose()
+
+
+PAGE_SIZE_KB = resource.getpagesize() // 1024
+
+
+def get_rss():
+    """Returns current resident memory in KB, peak one on platforms without
+    `/proc`.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE_KB
+    except IOError:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def percentile(values, rank):
+    """Returns nearest rank percentile.
+
+    :param values: The sorted values
+    :param rank: The percentile rank
+    """
+    index = int(round(rank / 100. * len(values) + .5)) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def summarize(durations, queries=None, rss=None):
+    durations = sorted(durations)
+    result = {
+        'requests': len(durations),
+        'mean_ms': sum(durations) / len(durations) * 1000,
+        'p50_ms': percentile(durations, 50) * 1000,
+        'p90_ms': percentile(durations, 90) * 1000,
+        'p99_ms': percentile(durations, 99) * 1000,
+    }
+    if queries is not None:
+        result['queries'] = max(queries)
+    if rss is not None:
+        result['rss_per_request_kb'] = float(sum(rss)) / len(rss)
+    return result
+
+
+SQL_TIMING = re.compile(r'sql;desc="(\d+) queries"')
+
+
+def bench_request(client, method, url, repeat, data=None):
+    """Requests url `repeat` times after a warm up request.
+
+    :param client: The test client
+    :param method: The HTTP method
+    :param url: The url, or a function of the iteration returning it
+    :param repeat: The request count
+    :param data: A function of the iteration returning form data
+    """
+    def request(i):
+        target = url(i) if callable(url) else url
+        kwargs = {'data': data(i)} if data is not None else {}
+        response = getattr(client, method)(target, **kwargs)
+        if response.status_code >= 400:
+            raise Exception('%s %s returned %s' % (method.upper(), target,
+                response.status_code))
+        return response
+
+    request(-1)
+    gc.collect()
+    durations, queries, rss = [], [], []
+    for i in xrange(repeat):
+        before = get_rss()
+        start = time()
+        response = request(i)
+        durations.append(time() - start)
+        rss.append(get_rss() - before)
+        match = SQL_TIMING.search(response.headers.get('Server-Timing', ''))
+        if match:
+            queries.append(int(match.group(1)))
+    return summarize(durations, queries or None, rss)
+
+
+def run(rows, repeat, modules):
+    """Runs all scenarios and returns results by scenario name.
+
+    :param rows: The fixture row count
+    :param repeat: The request count by scenario
+    :param modules: The extra module counts for navigation scenarios
+    """
+    database = os.path.join(tempfile.gettempdir(),
+        'flask_dashed_bench_%d.db' % rows)
+    if not os.path.exists(database):
+        populate(database, rows)
+    results = {}
+    app, db, admin, models = build_app(database)
+    client = app.test_client()
+    last_page = max(rows // 10, 1)
+    scenarios = [
+        ('list_columns_4', 'get', '/admin/users/'),
+        ('list_depth_0', 'get', '/admin/companies/'),
+        ('list_depth_1', 'get', '/admin/companies/warehouses/'),
+        ('list_depth_2', 'get', '/admin/profiles/'),
+        ('list_depth_2_projected', 'get', '/admin/projected-profiles/'),
+        ('list_page_10', 'get', '/admin/profiles/page/10'),
+        ('list_page_last_offset', 'get',
+            '/admin/profiles/page/%d' % last_page),
+        ('list_page_last_keyset', 'get',
+            '/admin/keyset-profiles/?after=%d' % (rows - 10)),
+        ('list_ordered_relation', 'get',
+            '/admin/profiles/?orderby=company.name&orderdir=asc'),
+        ('search_selective', 'get', '/admin/users/?search=user4242'),
+        ('search_broad', 'get', '/admin/profiles/?search=Paris'),
+        ('form_get', 'get', '/admin/companies/1/edit'),
+        ('dashboard', 'get', '/admin/'),
+    ]
+    for name, method, url in scenarios:
+        results[name] = bench_request(client, method, url, repeat)
+    # Restores edited company so that fixture is left as generated
+    Company = models[0]
+    engine = db.get_engine(app)
+    name = engine.execute(select([Company.name]).where(
+        Company.id == 1)).scalar()
+    try:
+        results['form_post'] = bench_request(client, 'post',
+            '/admin/companies/1/edit', repeat,
+            data=lambda i: {'name': u'company renamed %d' % i})
+    finally:
+        db.session.remove()
+        engine.execute(Company.__table__.update().where(
+            Company.id == 1).values(name=name))
+
+    for count in modules:
+        start = time()
+        app, db, admin, models = build_app(database, modules=count)
+        startup = time() - start
+        client = app.test_client()
+        result = bench_request(client, 'get', '/admin/', repeat)
+        result['startup_ms'] = startup * 1000
+        results['navigation_modules_%d' % count] = result
+        uncached = bench_request(client, 'get', lambda i:
+            admin.navigation_cache.clear() or '/admin/', repeat)
+        result['uncached_p50_ms'] = uncached['p50_ms']
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints p50 ratios to baseline and returns regressed scenarios.
+
+    :param results: The current results
+    :param baseline: The baseline results
+    :param threshold: The tolerated slow down ratio
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        ratio = results[name]['p50_ms'] / max(baseline[name]['p50_ms'], 1e-6)
+        flag = ' REGRESSION' if ratio > threshold else ''
+        print '%-32s %8.2f ms %6.2fx%s' % (name, results[name]['p50_ms'],
+            ratio, flag)
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000,
+        help='generated row count, from 10k to 10M')
+    parser.add_argument('--repeat', type=int, default=50,
+        help='request count by scenario')
+    parser.add_argument('--modules', type=int, nargs='*',
+        default=[10, 100, 1000], help='module counts for navigation')
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument('--compare', help='baseline JSON results file')
+    parser.add_argument('--threshold', type=float, default=1.2,
+        help='tolerated p50 slow down ratio to baseline')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'rows': args.rows,
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': run(args.rows, args.repeat, args.modules),
+    }
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print output
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results['results'], baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,100 @@
 # -*- coding: utf-8 -*-
-from werkzeug import OrderedMultiDict
+from hashlib import md5
+from operator import attrgetter
+from threading import RLock
+from weakref import WeakKeyDictionary
+from werkzeug import OrderedMultiDict, cached_property
 
-from flask import Blueprint, url_for, request, abort
+from flask import Blueprint, url_for, request, abort, g
+from flask import has_request_context, render_template, Markup
 from views import ObjectListView, ObjectFormView
-from views import ObjectDeleteView, secure
+from views import ObjectDeleteView, ObjectExportView, ObjectBulkView
+from views import secure, ConflictError
+from count import ExactCount
+from cache import LRUCache, get_counter, inc_counter
+from profiling import phase
+
+
+class AttributeAccessor(object):
+    """Compiled dotted attribute path getter, None is returned when an
+    attribute along the path doesn't exist.
+
+    eg::
+
+        accessor = AttributeAccessor('b.c')
+        accessor(a) => 1
+
+    :param path: The dotted attribute path
+    """
+    __slots__ = ('path', '_getter')
+
+    def __init__(self, path):
+        self.path = path
+        self._getter = attrgetter(path)
+
+    def __call__(self, obj):
+        try:
+            return self._getter(obj)
+        except AttributeError:
+            return None
+
+    def __repr__(self):
+        return '<AttributeAccessor %r>' % self.path
+
+
+_accessors = {}
+
+
+def get_accessor(path):
+    """Returns accessor for dotted attribute path, accessors are compiled
+    once per path.
+
+    :param path: The dotted attribute path
+    """
+    try:
+        return _accessors[path]
+    except KeyError:
+        accessor = _accessors[path] = AttributeAccessor(path)
+        return accessor
+
+
+# Guards lazily built module attributes and views
+_build_lock = RLock()
+
+
+class lazy_class_attribute(object):
+    """Class attribute built by decorated function on first access, once
+    per class and thread-safely. Subclasses may still override it with a
+    plain attribute.
+
+    :param function: The function taking class and returning value
+    """
+    def __init__(self, function):
+        self.function = function
+        self.__doc__ = function.__doc__
+        self._values = WeakKeyDictionary()
+
+    def __get__(self, obj, cls):
+        try:
+            return self._values[cls]
+        except KeyError:
+            pass
+        with _build_lock:
+            if cls not in self._values:
+                self._values[cls] = self.function(cls)
+            return self._values[cls]
+
+
+def get_class_attribute(cls, name):
+    """Returns class attribute without triggering descriptors.
+
+    :param cls: The class
+    :param name: The attribute name
+    """
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass.__dict__[name]
+    raise AttributeError(name)
 
 
 def recursive_getattr(obj, attr):
@@ -18,14 +109,102 @@ def recursive_getattr(obj, attr):
         recursive_getattr(a, 'b.c') => 1
         recursive_getattr(a, 'b.d') => None
     """
-    try:
-        if "." not in attr:
-                return getattr(obj, attr)
+    return get_accessor(attr)(obj)
+
+
+def split_path(path):
+    """Returns url path segments.
+
+    :param path: The url path
+    """
+    return [segment for segment in path.split('/') if segment]
+
+
+class PermissionEvaluator(object):
+    """Evaluates security functions at most once per request. Results of
+    functions taking no argument (path security ones) may also be kept in
+    `store` by user identity for `timeout` seconds.
+
+    eg::
+
+        def identity():
+            return session.get('user_id', None)
+
+        admin = Admin(app, permissions=PermissionEvaluator(LRUCache(),
+            identity))
+
+    :param store: A werkzeug cache object, `flask_dashed.cache.LRUCache`
+        for instance
+    :param identity: A function returning current user identity, results
+        aren't stored when it returns None
+    :param timeout: The store timeout in seconds
+    """
+    def __init__(self, store=None, identity=None, timeout=300):
+        self.store = store
+        self.identity = identity
+        self.timeout = timeout
+
+    @property
+    def stats(self):
+        """Returns current request evaluation counters: `evaluated` for
+        functions actually run, `memoized` for results reused within the
+        request, `stored` for results read from store.
+        """
+        if not has_request_context():
+            return {'evaluated': 0, 'memoized': 0, 'stored': 0}
+        if not hasattr(g, '_dashed_permission_stats'):
+            g._dashed_permission_stats = {'evaluated': 0, 'memoized': 0,
+                'stored': 0}
+        return g._dashed_permission_stats
+
+    def get_store_key(self, function, identity):
+        """Returns store key for function and user identity.
+
+        :param function: The security function
+        :param identity: The user identity
+        """
+        return 'flask_dashed.permission:%s:%s.%s:%x' % (identity,
+            function.__module__, function.__name__, hash(function))
+
+    def evaluate(self, function, *args, **kwargs):
+        """Returns security function result.
+
+        :param function: The security function
+        """
+        if not has_request_context():
+            return function(*args, **kwargs)
+        if not hasattr(g, '_dashed_permissions'):
+            g._dashed_permissions = {}
+        stats = self.stats
+        key = (function, args, tuple(sorted(kwargs.items())))
+        try:
+            result = g._dashed_permissions[key]
+            stats['memoized'] += 1
+            return result
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable arguments
+            stats['evaluated'] += 1
+            return function(*args, **kwargs)
+        store_key = None
+        if self.store is not None and self.identity is not None\
+                and not args and not kwargs:
+            identity = self.identity()
+            if identity is not None:
+                store_key = self.get_store_key(function, identity)
+        result = None
+        if store_key is not None:
+            result = self.store.get(store_key)
+        if result is None:
+            result = bool(function(*args, **kwargs))
+            stats['evaluated'] += 1
+            if store_key is not None:
+                self.store.set(store_key, result, timeout=self.timeout)
         else:
-            l = attr.split('.')
-            return recursive_getattr(getattr(obj, l[0]), '.'.join(l[1:]))
-    except AttributeError:
-        return None
+            stats['stored'] += 1
+        g._dashed_permissions[key] = result
+        return result
 
 
 class AdminNode(object):
@@ -39,7 +218,14 @@ class AdminNode(object):
         & breadcrumbs
     :param title: The long title
     :param parent: The parent node
+
+    `url_path` (the url path relative to admin one), `parents` (all parent
+    hierarchy as tuple, usefull for breadcrumbs) and `depth` are computed
+    once at construction.
     """
+    __slots__ = ('admin', 'parent', 'url_prefix', 'endpoint', 'short_title',
+        'title', 'children', 'url_path', 'parents', 'depth')
+
     def __init__(self, admin, url_prefix, endpoint, short_title, title=None,
             parent=None):
         self.admin = admin
@@ -49,26 +235,14 @@ class AdminNode(object):
         self.short_title = short_title
         self.title = title
         self.children = []
-
-    @property
-    def url_path(self):
-        """Returns the url path relative to admin one.
-        """
-        if self.parent:
-            return self.parent.url_path + self.url_prefix
-        else:
-            return self.url_prefix
-
-    @property
-    def parents(self):
-        """Returns all parent hierarchy as list. Usefull for breadcrumbs.
-        """
-        if self.parent:
-            parents = list(self.parent.parents)
-            parents.append(self.parent)
-            return parents
+        # Ancestry never changes once node is built
+        if parent:
+            self.url_path = parent.url_path + url_prefix
+            self.parents = parent.parents + (parent,)
         else:
-            return []
+            self.url_path = url_prefix
+            self.parents = ()
+        self.depth = len(self.parents)
 
     def secure(self, http_code=403):
         """Gives a way to secure specific url path.
@@ -81,6 +255,35 @@ class AdminNode(object):
         return decorator
 
 
+class NavigationItem(object):
+    """Frozen navigation entry for a node. Its url is resolved on use so that
+    items may be built out of requests and follow request script root.
+
+    :param node: The admin node
+    :param parents: The parent items
+    """
+    __slots__ = ('node', 'url_path', 'short_title', 'title', 'css_class',
+        'parents', 'children')
+
+    def __init__(self, node, parents=()):
+        self.node = node
+        self.url_path = node.url_path
+        self.short_title = node.short_title
+        self.title = node.title
+        self.css_class = node.__class__.__name__.lower()
+        self.parents = parents
+        self.children = ()
+
+    @property
+    def url(self):
+        """Returns node url within current request, None for nodes without
+        views.
+        """
+        if not isinstance(self.node, AdminModule):
+            return None
+        return self.node.url
+
+
 class Admin(object):
     """Class that provides a way to add admin interface to Flask applications.
 
@@ -88,9 +291,10 @@ class Admin(object):
     :param url_prefix: The url prefix
     :param main_dashboard: The main dashboard object
     :param endpoint: The endpoint
+    :param permissions: The `PermissionEvaluator` for security functions
     """
     def __init__(self, app, url_prefix="/admin", title="flask-dashed",
-            main_dashboard=None, endpoint='admin'):
+            main_dashboard=None, endpoint='admin', permissions=None):
 
         if not main_dashboard:
             from dashboard import DefaultDashboard
@@ -102,13 +306,33 @@ class Admin(object):
         self.url_prefix = url_prefix
         self.endpoint = endpoint
         self.title = title
+        self.permissions = permissions if permissions is not None\
+            else PermissionEvaluator()
+        # See `flask_dashed.jobs.JobRunner`
+        self.job_runner = None
+        # See `flask_dashed.profiling.Profiler`
+        self.profiler = None
+        # See `flask_dashed.ext.sqlalchemy.UnitOfWork`
+        self.unit_of_work = None
         self.secure_functions = OrderedMultiDict()
+        # Security functions by path segments as `(functions, children)`
+        self._security_trie = ([], {})
+        # Security functions by endpoint
+        self._security_cache = {}
         # Checks security for current path
-        self.blueprint.before_request(
-            lambda: self.check_path_security(request.path))
+        self.blueprint.before_request(self._check_request_security)
 
         self.app.register_blueprint(self.blueprint, url_prefix=url_prefix)
         self.root_nodes = []
+        # Node indexes by endpoint, url path and full rule endpoint
+        self._nodes_by_endpoint = {}
+        self._nodes_by_path = {}
+        self._nodes_by_rule = {}
+        # Navigation model built on first use
+        self._navigation = None
+        self._navigation_items = {}
+        # Rendered navigation by active node and visible nodes
+        self.navigation_cache = LRUCache(threshold=256, default_timeout=3600)
 
         self._add_node(main_dashboard, '/', 'main-dashboard', 'dashboard')
         # Registers recursive_getattr filter
@@ -148,12 +372,111 @@ class Admin(object):
             parent.children.append(new_node)
         else:
             self.root_nodes.append(new_node)
+        self._nodes_by_endpoint[new_node.endpoint] = new_node
+        self._nodes_by_path[new_node.url_path] = new_node
+        self._navigation = None
+        self.navigation_cache.clear()
         return new_node
 
+    def warm_up(self):
+        """Builds lazily built modules parts (views, forms, list metadata)
+        and navigation, eg: in master process before forking workers.
+        """
+        for node in self._nodes_by_endpoint.values():
+            if hasattr(node, 'warm_up'):
+                node.warm_up()
+        self.navigation
+
+    @property
+    def navigation(self):
+        """Returns navigation model as a `NavigationItem` tuple. It's built
+        once all nodes are registered, on first use.
+        """
+        if self._navigation is None:
+            self._build_navigation()
+        return self._navigation
+
+    def get_navigation_item(self, node):
+        """Returns navigation item for given node.
+
+        :param node: The admin node
+        """
+        if self._navigation is None:
+            self._build_navigation()
+        return self._navigation_items[node]
+
+    def _build_navigation(self):
+        """Builds navigation items tree and index by node.
+        """
+        items = {}
+
+        def build(nodes, parents):
+            built = []
+            for node in nodes:
+                item = items[node] = NavigationItem(node, parents)
+                item.children = build(node.children, parents + (item,))
+                built.append(item)
+            return tuple(built)
+
+        navigation = build(self.root_nodes, ())
+        self._navigation_items = items
+        self._navigation = navigation
+
+    def render_navigation(self, module=None):
+        """Returns navigation html for current user, rendered once by active
+        node and set of visible nodes.
+
+        :param module: The active node
+        """
+        visible = frozenset(item.node for item in self._iter_items(
+            self.navigation) if self.is_path_allowed(item.url_path))
+        active, endpoint = frozenset(), None
+        if isinstance(module, AdminNode):
+            item = self.get_navigation_item(module)
+            active = frozenset([module] + [p.node for p in item.parents])
+            endpoint = module.endpoint
+        key = (request.script_root, endpoint, visible)
+        navigation = self.navigation_cache.get(key)
+        if navigation is None:
+            navigation = Markup(render_template(
+                'flask_dashed/navigation.html', admin=self,
+                navigation=self.navigation, active=active, visible=visible))
+            self.navigation_cache.set(key, navigation)
+        return navigation
+
+    def _iter_items(self, items):
+        """Yields navigation items recursively.
+        """
+        for item in items:
+            yield item
+            for child in self._iter_items(item.children):
+                yield child
+
     @property
     def main_dashboard(self):
         return self.root_nodes[0]
 
+    def get_node(self, endpoint):
+        """Returns node registered with given endpoint.
+
+        :param endpoint: The node endpoint
+        """
+        return self._nodes_by_endpoint.get(endpoint, None)
+
+    def get_node_by_path(self, path):
+        """Returns node registered at given url path relative to admin one.
+
+        :param path: The node url path
+        """
+        return self._nodes_by_path.get(path, None)
+
+    def get_request_node(self):
+        """Returns node owning current request, None outside admin modules.
+        """
+        if request.url_rule is None:
+            return None
+        return self._nodes_by_rule.get(request.url_rule.endpoint, None)
+
     def add_path_security(self, path, function, http_code=403):
         """Registers security function for given path.
 
@@ -162,17 +485,90 @@ class Admin(object):
         :param http_code: The response http code
         """
         self.secure_functions.add(path, (function, http_code))
+        node = self._security_trie
+        for segment in split_path(path):
+            node = node[1].setdefault(segment, ([], {}))
+        node[0].append((function, http_code))
+        self._security_cache.clear()
+
+    def get_path_security(self, path):
+        """Returns `(function, http_code)` list securing given path relative
+        to admin one, parents first.
+
+        :param path: The relative path
+        """
+        node = self._security_trie
+        functions = list(node[0])
+        for segment in split_path(path):
+            node = node[1].get(segment, None)
+            if node is None:
+                break
+            functions.extend(node[0])
+        return functions
 
-    def check_path_security(self, path):
+    def get_rule_security(self, rule):
+        """Returns `(function, http_code)` list securing given url rule,
+        memoized by endpoint. Returns None when it depends on rule variables.
+
+        :param rule: The url rule
+        """
+        try:
+            return self._security_cache[rule.endpoint]
+        except KeyError:
+            pass
+        static = rule.rule[len(self.url_prefix):]
+        functions = None
+        if not rule.rule.startswith(self.url_prefix):
+            pass
+        elif '<' not in static:
+            functions = self.get_path_security(static)
+        else:
+            static = static.split('<', 1)[0]
+            if not static.endswith('/'):
+                static = static.rsplit('/', 1)[0]
+            node = self._security_trie
+            for segment in split_path(static):
+                node = node[1].get(segment, None)
+                if node is None:
+                    break
+            if node is None or not node[1]:
+                functions = self.get_path_security(static)
+        self._security_cache[rule.endpoint] = functions
+        return functions
+
+    def _check_request_security(self):
+        """Checks security for current request path.
+        """
+        with phase('security'):
+            self.check_path_security(request.path, request.url_rule)
+
+    def check_path_security(self, path, rule=None):
         """Checks security for specific and path.
 
         :param path: The path to check
+        :param rule: The matched url rule, if any, to memoize lookup
+        """
+        functions = None
+        if rule is not None:
+            functions = self.get_rule_security(rule)
+        if functions is None:
+            if not path.startswith(self.url_prefix):
+                return
+            functions = self.get_path_security(path[len(self.url_prefix):])
+        for function, http_code in functions:
+            if not self.permissions.evaluate(function):
+                return abort(http_code)
+
+    def is_path_allowed(self, path):
+        """Returns whether every security function securing given path
+        relative to admin one passes.
+
+        :param path: The relative path
         """
-        for key in self.secure_functions.iterkeys():
-            if path.startswith("%s%s" % (self.url_prefix, key)):
-                for function, http_code in self.secure_functions.getlist(key):
-                    if not function():
-                        return abort(http_code)
+        for function, http_code in self.get_path_security(path):
+            if not self.permissions.evaluate(function):
+                return False
+        return True
 
 
 class AdminModule(AdminNode):
@@ -189,28 +585,74 @@ class AdminModule(AdminNode):
     def __init__(self, *args, **kwargs):
         super(AdminModule, self).__init__(*args, **kwargs)
         self.rules = OrderedMultiDict()
+        # Built view functions and pending security functions by endpoint
+        self._views = {}
+        self._views_security = {}
+        # All `(function, http_code)` securing endpoints, by endpoint
+        self._endpoint_security = {}
         self._register_rules()
 
     def add_url_rule(self, rule, endpoint, view_func, **options):
         """Adds a routing rule to the application from relative endpoint.
-        `view_class` is copied as we need to dynamically apply decorators.
+        `view_class` is copied as we need to dynamically apply decorators,
+        which is deferred to the first request.
 
         :param rule: The rule
         :param endpoint: The endpoint
         :param view_func: The view
         """
-        class ViewClass(view_func.view_class):
-            pass
+        def view(*args, **kwargs):
+            return self.get_view(endpoint)(*args, **kwargs)
 
-        ViewClass.__name__ = "%s_%s" % (self.endpoint, endpoint)
-        ViewClass.__module__ = view_func.__module__
-        view_func.view_class = ViewClass
+        for attribute in ('methods', 'required_methods',
+                'provide_automatic_options'):
+            if hasattr(view_func, attribute):
+                setattr(view, attribute, getattr(view_func, attribute))
+        # Whether GET requests may write
+        view.read_only = getattr(getattr(view_func, 'view_class', None),
+            'read_only', False)
         full_endpoint = "%s.%s_%s" % (self.admin.endpoint,
             self.endpoint, endpoint)
+        view.__name__ = str(full_endpoint)
         self.admin.app.add_url_rule("%s%s%s" % (self.admin.url_prefix,
-            self.url_path, rule), full_endpoint, view_func, **options)
+            self.url_path, rule), full_endpoint, view, **options)
+        self.admin._nodes_by_rule[full_endpoint] = self
+        self._views.pop(endpoint, None)
         self.rules.setlist(endpoint, [(rule, endpoint, view_func)])
 
+    def get_view(self, endpoint):
+        """Returns view function for endpoint, building its own view class
+        on first call.
+
+        :param endpoint: The endpoint
+        """
+        try:
+            return self._views[endpoint]
+        except KeyError:
+            pass
+        with _build_lock:
+            if endpoint not in self._views:
+                rule, endpoint, view_func = self.rules.get(endpoint)
+
+                class ViewClass(view_func.view_class):
+                    pass
+
+                ViewClass.__name__ = "%s_%s" % (self.endpoint, endpoint)
+                ViewClass.__module__ = view_func.__module__
+                view_func.view_class = ViewClass
+                for function, http_code in self._views_security.pop(
+                        endpoint, []):
+                    ViewClass.dispatch_request = secure(endpoint, function,
+                        http_code)(ViewClass.dispatch_request)
+                self._views[endpoint] = view_func
+            return self._views[endpoint]
+
+    def warm_up(self):
+        """Builds everything otherwise built on first use.
+        """
+        for endpoint in self.rules:
+            self.get_view(endpoint)
+
     def _register_rules(self):
         """Registers all module rules after initialization.
         """
@@ -220,6 +662,33 @@ class AdminModule(AdminNode):
         for rule, endpoint, view_func in self.default_rules:
             self.add_url_rule(rule, endpoint, view_func)
 
+    def check_endpoint_security(self, endpoint, view):
+        """Aborts unless every function securing endpoint passes, for views
+        standing in for it.
+
+        :param endpoint: The secured endpoint
+        :param view: The view evaluating functions
+        """
+        for function, http_code in self._endpoint_security.get(endpoint, []):
+            with phase('security'):
+                allowed = self.admin.permissions.evaluate(function, view)
+            if not allowed:
+                return abort(http_code)
+
+    def is_endpoint_allowed(self, endpoint, view):
+        """Returns whether module path and endpoint security functions pass,
+        for views standing in for it.
+
+        :param endpoint: The secured endpoint
+        :param view: The view evaluating functions
+        """
+        if not self.admin.is_path_allowed(self.url_path):
+            return False
+        for function, http_code in self._endpoint_security.get(endpoint, []):
+            if not self.admin.permissions.evaluate(function, view):
+                return False
+        return True
+
     @property
     def url(self):
         """Returns first registered (main) rule as url.
@@ -249,6 +718,13 @@ class AdminModule(AdminNode):
         :param secure_function: The function to check
         :param http_code: The response http code when False.
         """
+        self._endpoint_security.setdefault(endpoint, []).append(
+            (secure_function, http_code))
+        with _build_lock:
+            if endpoint not in self._views:
+                self._views_security.setdefault(endpoint, []).append(
+                    (secure_function, http_code))
+                return
         rule, endpoint, view_func = self.rules.get(endpoint)
         view_func.view_class.dispatch_request =\
             secure(endpoint, secure_function, http_code)(
@@ -263,26 +739,63 @@ class ObjectAdminModule(AdminModule):
     # List relateds
     list_view = ObjectListView
     list_template = 'flask_dashed/list.html'
+    # Objects table, pagination and counter rendered within `list_template`
+    list_content_template = 'flask_dashed/list_content.html'
+    # Werkzeug cache of rendered list contents, None disables caching
+    list_cache = None
+    list_cache_timeout = 300
     list_fields = None
     list_title = 'list'
     list_per_page = 10
+    # Either `offset` (numbered pages) or `keyset` (previous/next cursors)
+    list_pagination = 'offset'
+    # Count strategy, see `flask_dashed.count`
+    list_count = ExactCount()
     searchable_fields = None
+    # Backend specific search strategy
+    search_strategy = None
     order_by = None
     # Edit relateds
     edit_template = 'flask_dashed/edit.html'
     form_view = ObjectFormView
     form_class = None
     edit_title = 'edit object'
+    # Seconds a not modified edit form may be reused by browsers, below
+    # CSRF tokens lifetime
+    form_etag_timeout = 600
     # New relateds
     new_title = 'new object'
     # Delete relateds
     delete_view = ObjectDeleteView
+    # Export relateds
+    export_view = ObjectExportView
+    # Actions (`export`, `bulk`) dispatched to admin `job_runner`
+    background_actions = ()
+    # Bulk relateds
+    bulk_view = ObjectBulkView
+    # Actions applying to selected objects by name, eg: ('publish',
+    # {'label': 'publish', 'values': {'published': True}}), secured as
+    # their `endpoint` (`edit` by default)
+    bulk_actions = None
 
     def __new__(cls, *args, **kwargs):
-        if not cls.list_fields:
+        list_fields = get_class_attribute(cls, 'list_fields')
+        if not isinstance(list_fields, lazy_class_attribute) and\
+                not list_fields:
             raise NotImplementedError()
         return super(ObjectAdminModule, cls).__new__(cls, *args, **kwargs)
 
+    @cached_property
+    def list_accessors(self):
+        """List fields and their accessors.
+        """
+        return [(field, get_accessor(field)) for field in self.list_fields]
+
+    def warm_up(self):
+        super(ObjectAdminModule, self).warm_up()
+        self.list_accessors
+        self.form_class
+
     @property
     def default_rules(self):
         """Adds object list rule to current app.
@@ -296,10 +809,14 @@ class ObjectAdminModule(AdminModule):
                 self)),
             ('/<pk>/delete', 'delete', self.delete_view.as_view('short_title',
                 self)),
+            ('/export', 'export', self.export_view.as_view('short_title',
+                self)),
+            ('/bulk', 'bulk', self.bulk_view.as_view('short_title', self)),
         ]
 
     def get_object_list(self, search=None, order_by_field=None,
-            order_by_direction=None, offset=None, limit=None):
+            order_by_direction=None, offset=None, limit=None, after=None,
+            before=None):
         """Returns objects list ordered and filtered.
 
         :param search: The search string for quick filtering
@@ -307,6 +824,10 @@ class ObjectAdminModule(AdminModule):
         :param order_by_direction: The ordering direction
         :param offset: The pagintation offset
         :param limit: The pagination limit
+        :param after: The primary key of the object preceding the page
+            (keyset pagination)
+        :param before: The primary key of the object following the page
+            (keyset pagination)
         """
         raise NotImplementedError()
 
@@ -317,6 +838,53 @@ class ObjectAdminModule(AdminModule):
         """
         raise NotImplementedError()
 
+    def estimate_count(self, search=None):
+        """Estimates filtered object list total, falls back on exact
+        count.
+
+        :param search: The search string for quick filtering.
+        """
+        return self.count_list(search=search)
+
+    def get_list_count(self, search=None):
+        """Returns filtered object list total according to `list_count`
+        strategy, None when unknown.
+
+        :param search: The search string for quick filtering.
+        """
+        return self.list_count.count(self, search=search)
+
+    def get_list_cache_key(self):
+        """Returns current request list content cache key, depending on list
+        generation, request url and user identity, None when caching is
+        disabled.
+        """
+        if self.list_cache is None:
+            return None
+        identity = self.admin.permissions.identity
+        return 'flask_dashed.list:%s.%s:%s' % (self.admin.endpoint,
+            self.endpoint, md5(repr((self.get_list_generation(),
+            identity() if identity is not None else None, request.url)))\
+            .hexdigest())
+
+    def get_list_generation(self):
+        """Returns list generation, cached contents of previous generations
+        being discarded.
+        """
+        return get_counter(self.list_cache, self._list_generation_key)
+
+    def invalidate_list_cache(self):
+        """Starts a new list generation, backends must call it once objects
+        changes are committed.
+        """
+        if self.list_cache is not None:
+            inc_counter(self.list_cache, self._list_generation_key)
+
+    @property
+    def _list_generation_key(self):
+        return 'flask_dashed.list_generation:%s.%s' % (self.admin.endpoint,
+            self.endpoint)
+
     def get_action_for_field(self, field, obj):
         """Returns title and link for given list field and object.
 
@@ -334,6 +902,56 @@ class ObjectAdminModule(AdminModule):
                 url = url(obj)
         return title, url
 
+    def get_list_rows(self, objects):
+        """Returns `(object, cells)` rows, cells being `(field, value, title,
+        url)` tuples, so that each cell is resolved once per rendering.
+
+        :param objects: The list objects
+        """
+        rows = []
+        for obj in objects:
+            cells = []
+            for field, accessor in self.list_accessors:
+                value = accessor(obj)
+                if value:
+                    title, url = self.get_action_for_field(field, obj)
+                else:
+                    title, url = None, None
+                cells.append((field, value, title, url))
+            rows.append((obj, cells))
+        return rows
+
+    def iter_export_objects(self, search=None, order_by_name=None,
+            order_by_direction=None):
+        """Returns an iterable over all filtered and ordered objects, which
+        should fetch them lazily.
+
+        :param search: The search string for quick filtering
+        :param order_by_name: The ordering field
+        :param order_by_direction: The ordering direction
+        """
+        raise NotImplementedError()
+
+    def iter_export_rows(self, objects):
+        """Yields list field values for each object.
+
+        :param objects: The objects iterable
+        """
+        accessors = [accessor for field, accessor in self.list_accessors]
+        for obj in objects:
+            yield [accessor(obj) for accessor in accessors]
+
+    def execute_bulk_action(self, name, pks=None, search=None):
+        """Applies bulk action to objects with given primary keys or, when
+        `pks` is None, to all objects matching search. Returns affected
+        object count.
+
+        :param name: The bulk action name
+        :param pks: The selected object primary keys
+        :param search: The search string for quick filtering
+        """
+        raise NotImplementedError()
+
     def get_actions_for_object(self, object):
         """Returns action available for each object.
 
@@ -341,12 +959,21 @@ class ObjectAdminModule(AdminModule):
         """
         raise NotImplementedError()
 
-    def get_form(self, obj):
-        """Returns form initialy populate from object instance.
+    def get_object_pk(self, obj):
+        """Returns object primary key.
 
         :param obj: The object
         """
-        return self.form_class(obj=obj)
+        raise NotImplementedError()
+
+    def get_form(self, obj, formdata=None):
+        """Returns form initialy populate from object instance, then from
+        submitted data if any, in a single processing pass.
+
+        :param obj: The object
+        :param formdata: The submitted data
+        """
+        return self.form_class(formdata, obj=obj)
 
     def get_object(self, pk=None):
         """Returns object retrieve by primary key.
@@ -359,10 +986,34 @@ class ObjectAdminModule(AdminModule):
         """Returns new object instance."""
         raise NotImplementedError()
 
-    def save_object(self, object):
-        """Persits object.
+    def get_data_version(self):
+        """Returns a cheap version of data displayed by list and edit pages,
+        changing whenever they change, so that unchanged pages are answered
+        304 Not Modified. None disables conditional requests.
+        """
+        return None
+
+    def get_last_modified(self):
+        """Returns UTC datetime of the last data modification, sent as
+        `Last-Modified` along with data version ETags, None when unknown.
+        """
+        return None
+
+    def get_object_version(self, object):
+        """Returns object version carried by forms for optimistic locking,
+        None when objects aren't versioned.
+
+        :param object: The object
+        """
+        return None
+
+    def save_object(self, object, version=None):
+        """Persits object, raises `ConflictError` when object version
+        changed since the form was rendered. Forms of versioned objects
+        posted without version are answered as conflicts.
 
         :param object: The object to persist
+        :param version: The object version when form was rendered
         """
         raise NotImplementedError()
 
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import random
+from collections import OrderedDict
+from threading import RLock
+from time import time
+from werkzeug.contrib.cache import BaseCache
+
+
+class LRUCache(BaseCache):
+    """In-process werkzeug cache dropping least recently used items once
+    `threshold` is reached. Unlike `SimpleCache` values aren't pickled, so
+    they are shared rather than copied.
+
+    :param threshold: The maximum number of items
+    :param default_timeout: The default timeout in seconds
+    """
+    def __init__(self, threshold=500, default_timeout=300):
+        BaseCache.__init__(self, default_timeout)
+        self._items = OrderedDict()
+        self._threshold = threshold
+        self._lock = RLock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._items.pop(key)
+            except KeyError:
+                return None
+            if expires <= time():
+                return None
+            self._items[key] = (expires, value)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (time() + timeout, value)
+            while len(self._items) > self._threshold:
+                self._items.popitem(last=False)
+
+    def add(self, key, value, timeout=None):
+        with self._lock:
+            if self.get(key) is None:
+                self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def inc(self, key, delta=1):
+        with self._lock:
+            value = (self.get(key) or 0) + delta
+            self.set(key, value)
+            return value
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+
+def get_counter(cache, key):
+    """Returns counter value. Counters start from a random value so that a
+    reset (process restart, cache eviction) doesn't bring previous values
+    back.
+
+    :param cache: A werkzeug cache object
+    :param key: The counter key
+    """
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, random.getrandbits(32))
+        value = cache.get(key)
+    return value
+
+
+def inc_counter(cache, key):
+    """Increments counter.
+
+    :param cache: A werkzeug cache object
+    :param key: The counter key
+    """
+    get_counter(cache, key)
+    cache.inc(key)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from hashlib import md5
+from werkzeug.contrib.cache import SimpleCache
+
+
+class CountStrategy(object):
+    """Base class for object list count strategies.
+
+    `exact` tells whether returned total can be displayed as is.
+    """
+    exact = True
+
+    def count(self, module, search=None):
+        """Returns filtered object list total or None when unknown.
+
+        :param module: The object admin module
+        :param search: The search string for quick filtering
+        """
+        raise NotImplementedError()
+
+
+class ExactCount(CountStrategy):
+    """Counts objects on every request.
+    """
+    def count(self, module, search=None):
+        return module.count_list(search=search)
+
+
+class CachedCount(CountStrategy):
+    """Caches exact counts by module and search string.
+
+    :param timeout: The cache timeout in seconds
+    :param cache: A werkzeug cache object, defaults to `SimpleCache`
+    """
+    def __init__(self, timeout=300, cache=None):
+        self.timeout = timeout
+        self.cache = cache if cache is not None else SimpleCache()
+
+    def get_key(self, module, search=None):
+        """Returns cache key for module and search string.
+
+        :param module: The object admin module
+        :param search: The search string
+        """
+        search = (search or u'').encode('utf-8')
+        return 'flask_dashed.count:%s.%s:%s' % (module.admin.endpoint,
+            module.endpoint, md5(search).hexdigest())
+
+    def count(self, module, search=None):
+        key = self.get_key(module, search)
+        count = self.cache.get(key)
+        if count is None:
+            count = module.count_list(search=search)
+            self.cache.set(key, count, timeout=self.timeout)
+        return count
+
+
+class EstimatedCount(CountStrategy):
+    """Relies on module `estimate_count`, usually the query planner row
+    estimate.
+    """
+    exact = False
+
+    def count(self, module, search=None):
+        return module.estimate_count(search=search)
+
+
+class NoCount(CountStrategy):
+    """Doesn't count at all, list views only know whether a next page
+    exists.
+    """
+    exact = False
+
+    def count(self, module, search=None):
+        return None
@@ -1,28 +1,218 @@
 # -*- coding: utf-8 -*-
+from hashlib import md5
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from time import time
+from flask import request
 from admin import AdminModule
-from views import DashboardView
+from cache import LRUCache
+from views import DashboardView, DashboardWidgetView
 
 
 class Dashboard(AdminModule):
     """A dashboard is a Widget holder usually used as admin entry point.
+
+    Widgets needing a render are rendered in request thread, or in parallel
+    on a thread pool of `widget_pool_size` threads. Pooled widgets are
+    rendered within a copy of the dashboard request whose `before_request`
+    functions are run again, request globals set otherwise are lost. Lazy
+    dashboards are rendered as a skeleton then each widget is loaded from
+    its own fragment endpoint.
     """
     widgets = []
+    # Loads widgets from fragment endpoints
+    lazy_widgets = False
+    # Default cache backend of widget renders
+    widget_cache = LRUCache(threshold=100, default_timeout=86400)
+    # Widget render thread count, 0 renders them in request thread
+    widget_pool_size = 0
+
+    def __init__(self, *args, **kwargs):
+        super(Dashboard, self).__init__(*args, **kwargs)
+        self._pool = None
+        self._lock = Lock()
+        self._refreshing = set()
 
     @property
     def default_rules(self):
-        return [('/', 'show', DashboardView.as_view(
-            'dashboard', self))]
+        return [
+            ('/', 'show', DashboardView.as_view('dashboard', self)),
+            ('/widgets/<int:index>', 'widget',
+                DashboardWidgetView.as_view('widget', self)),
+        ]
+
+    @property
+    def pool(self):
+        """Returns widget render thread pool, None if disabled.
+        """
+        if self._pool is None and self.widget_pool_size:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPool(self.widget_pool_size)
+        return self._pool
+
+    def render_widgets(self):
+        """Returns `(widget, content)` for each widget, content being None
+        when widget couldn't be rendered in time and has no previous render.
+        """
+        now = time()
+        contents = []
+        pending = []
+        for widget in self.widgets:
+            entry = widget.get_cache(self).get(widget.get_cache_key(self))
+            status = widget.get_cache_status(entry, now)
+            if status == 'stale':
+                self._refresh(widget)
+            elif status != 'fresh':
+                pending.append((len(contents), widget))
+            contents.append(entry[1] if entry else None)
+        if self.pool is None or not pending or (len(pending) == 1 and
+                pending[0][1].render_timeout is None):
+            for index, widget in pending:
+                contents[index] = self._render_widget(widget)
+        else:
+            environ = dict(request.environ)
+            results = [(index, widget, now + widget.render_timeout if
+                    widget.render_timeout is not None else None,
+                self.pool.apply_async(self._render_widget,
+                    (widget, environ))) for index, widget in pending]
+            for index, widget, deadline, result in results:
+                try:
+                    contents[index] = result.get(None if deadline is None
+                        else max(deadline - time(), 0))
+                except TimeoutError:
+                    pass
+                except Exception:
+                    if contents[index] is None:
+                        raise
+        return zip(self.widgets, contents)
+
+    def get_widget_entry(self, widget):
+        """Returns widget `(rendered at, content)`, rendered in request
+        thread unless cached.
+
+        :param widget: The widget
+        """
+        entry = widget.get_cache(self).get(widget.get_cache_key(self))
+        status = widget.get_cache_status(entry, time())
+        if status == 'stale':
+            self._refresh(widget)
+        elif status != 'fresh':
+            entry = (time(), self._render_widget(widget))
+        return entry
+
+    def _render_widget(self, widget, environ=None):
+        """Renders widget and stores render, within a new preprocessed
+        request context when rendered out of request thread.
+
+        :param widget: The widget
+        :param environ: The WSGI environ of the dashboard request
+        """
+        if environ is None:
+            content = widget.render()
+        else:
+            with self.admin.app.request_context(environ):
+                self.admin.app.preprocess_request()
+                content = widget.render()
+        widget.get_cache(self).set(widget.get_cache_key(self),
+            (time(), content))
+        return content
+
+    def _refresh(self, widget):
+        """Renders stale widget in background once at a time.
+
+        :param widget: The widget
+        """
+        key = widget.get_cache_key(self)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        if self.pool is None:
+            try:
+                self._render_widget(widget)
+            finally:
+                self._refreshing.discard(key)
+            return
+
+        def refresh(environ):
+            try:
+                self._render_widget(widget, environ)
+            finally:
+                self._refreshing.discard(key)
+        self.pool.apply_async(refresh, (dict(request.environ),))
 
 
 class DashboardWidget():
     """Dashboard widget builder.
+
+    Renders are cached for `cache_timeout` seconds then still served for
+    `stale_timeout` seconds while being refreshed in background. When render
+    takes more than `render_timeout` seconds, the previous render is shown.
     """
-    def __init__(self, title):
+    # Seconds a render is served as is, None disables caching
+    cache_timeout = None
+    # Seconds an expired render is served while refreshed
+    stale_timeout = 0
+    # Seconds to wait for render, None waits until done
+    render_timeout = None
+    # Cache backend, defaults to dashboard `widget_cache`
+    cache = None
+
+    def __init__(self, title, cache_timeout=None, stale_timeout=None,
+            render_timeout=None, cache=None):
         """Initialize a new widget instance.
 
         :param title: The widget title
+        :param cache_timeout: Overrides class `cache_timeout`
+        :param stale_timeout: Overrides class `stale_timeout`
+        :param render_timeout: Overrides class `render_timeout`
+        :param cache: Overrides class `cache`
         """
         self.title = title
+        if cache_timeout is not None:
+            self.cache_timeout = cache_timeout
+        if stale_timeout is not None:
+            self.stale_timeout = stale_timeout
+        if render_timeout is not None:
+            self.render_timeout = render_timeout
+        if cache is not None:
+            self.cache = cache
+
+    def get_cache(self, dashboard):
+        """Returns render cache backend.
+
+        :param dashboard: The dashboard
+        """
+        return self.cache if self.cache is not None else\
+            dashboard.widget_cache
+
+    def get_cache_key(self, dashboard):
+        """Returns render cache key, widgets rendering user specific content
+        must add the user to it.
+
+        :param dashboard: The dashboard
+        """
+        title = self.title.encode('utf-8') if isinstance(self.title,
+            unicode) else self.title
+        return 'flask_dashed.widget:%s.%s:%s.%s' % (dashboard.admin.endpoint,
+            dashboard.endpoint, self.__class__.__name__, md5(title).hexdigest())
+
+    def get_cache_status(self, entry, now):
+        """Returns `fresh`, `stale` or None when cached render must not be
+        used as is.
+
+        :param entry: The cached `(rendered at, content)`
+        :param now: The current timestamp
+        """
+        if entry is None or self.cache_timeout is None:
+            return None
+        age = now - entry[0]
+        if age < self.cache_timeout:
+            return 'fresh'
+        if age < self.cache_timeout + self.stale_timeout:
+            return 'stale'
 
     def render(self):
         """Returns html content to display.
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import re
+from sqlalchemy import event, func
+from sqlalchemy.schema import DDL
+from sqlalchemy.sql.expression import and_, or_, select, table
+from sqlalchemy.sql.expression import literal_column
+
+
+def tokenize(search):
+    """Returns search string words.
+
+    :param search: The search string
+    """
+    return re.compile(r'\w+', re.UNICODE).findall(search)
+
+
+def like_prefix(term):
+    """Returns LIKE pattern matching values starting with term, pattern is
+    built here rather than in SQL so that database may use an index.
+
+    :param term: The search term
+    """
+    term = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return term + '%'
+
+
+class SearchStrategy(object):
+    """Base class for `ModelAdminModule` search strategies.
+    """
+    def prepare(self, module_class):
+        """Called once module class is built, gives a way to register
+        database objects the strategy relies on.
+
+        :param module_class: The model admin module class
+        """
+        pass
+
+    def filter(self, module, query, search):
+        """Returns query filtered by search string.
+
+        :param module: The model admin module
+        :param query: The non filtered query
+        :param search: The search string
+        """
+        raise NotImplementedError()
+
+
+class ContainsSearch(SearchStrategy):
+    """Matches objects having the whole search string in one of searchable
+    fields (`LIKE '%search%'`). It can't use indexes.
+    """
+    def filter(self, module, query, search):
+        return query.filter(or_(*[column.contains(search)
+            for column in module.get_search_columns()]))
+
+
+class PrefixSearch(SearchStrategy):
+    """Matches objects having one of searchable fields starting with search
+    string (`LIKE 'search%'`) which lets database use B-tree indexes.
+    """
+    def filter(self, module, query, search):
+        pattern = like_prefix(search)
+        return query.filter(or_(*[column.like(pattern, escape='\\')
+            for column in module.get_search_columns()]))
+
+
+class TokenizedSearch(SearchStrategy):
+    """Matches objects for which every search string word is found in at
+    least one of searchable fields.
+
+    :param prefix: Matches words as field prefixes rather than anywhere
+    """
+    def __init__(self, prefix=False):
+        self.prefix = prefix
+
+    def get_condition(self, column, term):
+        if self.prefix:
+            return column.like(like_prefix(term), escape='\\')
+        return column.contains(term)
+
+    def filter(self, module, query, search):
+        columns = module.get_search_columns()
+        terms = tokenize(search)
+        if not terms:
+            return query
+        return query.filter(and_(*[or_(*[self.get_condition(column, term)
+            for column in columns]) for term in terms]))
+
+
+class FullTextSearch(SearchStrategy):
+    """Base class for database native full text search. Searchable fields
+    must be columns of module model table.
+
+    DDL statements returned by `ddl` are executed when model table is
+    created, existing databases have to run them once.
+
+    :param prefix: Matches search words as prefixes
+    """
+    dialect = None
+
+    def __init__(self, prefix=True):
+        self.prefix = prefix
+        self._prepared = set()
+
+    def get_columns(self, module_class):
+        """Returns searchable table columns.
+
+        :param module_class: The model admin module class
+        """
+        columns = []
+        for attribute in module_class.get_search_columns():
+            column = getattr(attribute, 'property', None)
+            column = column.columns[0] if column is not None else None
+            if column is None or\
+                    column.table is not module_class.model.__table__:
+                raise Exception('Full text searchable fields must be ' +
+                    'columns of `%s` table.' % module_class.model.__name__)
+            columns.append(column)
+        return columns
+
+    def ddl(self, module_class):
+        """Returns DDL statements creating full text index.
+
+        :param module_class: The model admin module class
+        """
+        raise NotImplementedError()
+
+    def drop_ddl(self, module_class):
+        """Returns DDL statements dropping full text index.
+
+        :param module_class: The model admin module class
+        """
+        return []
+
+    def prepare(self, module_class):
+        key = (module_class.model.__table__, tuple(self.ddl(module_class)))
+        if key in self._prepared:
+            return
+        self._prepared.add(key)
+        table = module_class.model.__table__
+        for statement in self.ddl(module_class):
+            event.listen(table, 'after_create',
+                DDL(statement).execute_if(dialect=self.dialect))
+        for statement in self.drop_ddl(module_class):
+            event.listen(table, 'before_drop',
+                DDL(statement).execute_if(dialect=self.dialect))
+
+
+class PostgresFullTextSearch(FullTextSearch):
+    """PostgreSQL `tsvector` search backed by a GIN expression index.
+
+    :param config: The text search configuration
+    :param prefix: Matches search words as prefixes
+    """
+    dialect = 'postgresql'
+
+    def __init__(self, config='simple', prefix=True):
+        super(PostgresFullTextSearch, self).__init__(prefix=prefix)
+        self.config = config
+
+    def get_document(self, columns):
+        """Returns the concatenated columns expression, identical to the
+        indexed one.
+
+        :param columns: The columns
+        """
+        document = None
+        for column in columns:
+            part = func.coalesce(column, literal_column("''"))
+            if document is None:
+                document = part
+            else:
+                document = document.op('||')(literal_column("' '"))\
+                    .op('||')(part)
+        return func.to_tsvector(literal_column("'%s'" % self.config),
+            document)
+
+    def ddl(self, module_class):
+        columns = self.get_columns(module_class)
+        document = " || ' ' || ".join("coalesce(%s, '')" % column.name
+            for column in columns)
+        table = module_class.model.__table__.name
+        return ["CREATE INDEX IF NOT EXISTS ix_%s_fts ON %s USING gin "
+            "(to_tsvector('%s', %s))" % (table, table, self.config, document)]
+
+    def filter(self, module, query, search):
+        terms = tokenize(search)
+        if not terms:
+            return query
+        config = literal_column("'%s'" % self.config)
+        if self.prefix:
+            tsquery = func.to_tsquery(config,
+                ' & '.join('%s:*' % term for term in terms))
+        else:
+            tsquery = func.plainto_tsquery(config, ' '.join(terms))
+        document = self.get_document(self.get_columns(module))
+        return query.filter(document.op('@@')(tsquery))
+
+
+class SQLiteFullTextSearch(FullTextSearch):
+    """SQLite FTS5 search backed by an external content virtual table kept
+    in sync by triggers. Model primary key must be an integer.
+
+    :param prefix: Matches search words as prefixes
+    """
+    dialect = 'sqlite'
+
+    def get_table_name(self, module_class):
+        """Returns the virtual table name.
+
+        :param module_class: The model admin module class
+        """
+        return '%s_fts' % module_class.model.__table__.name
+
+    def ddl(self, module_class):
+        table = module_class.model.__table__.name
+        fts = self.get_table_name(module_class)
+        primary_key = module_class.model.__mapper__.primary_key[0].name
+        names = [column.name for column in self.get_columns(module_class)]
+        columns = ', '.join(names)
+        new = ', '.join(['new.%s' % primary_key] +
+            ['new.%s' % name for name in names])
+        old = ', '.join(['old.%s' % primary_key] +
+            ['old.%s' % name for name in names])
+        insert = "INSERT INTO %s(rowid, %s) VALUES (%s);" % (fts, columns,
+            new)
+        delete = "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', %s);" %\
+            (fts, fts, columns, old)
+        return [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, "
+                "content='%s', content_rowid='%s')" % (fts, columns, table,
+                primary_key),
+            "CREATE TRIGGER IF NOT EXISTS %s_ai AFTER INSERT ON %s BEGIN "
+                "%s END" % (fts, table, insert),
+            "CREATE TRIGGER IF NOT EXISTS %s_ad AFTER DELETE ON %s BEGIN "
+                "%s END" % (fts, table, delete),
+            "CREATE TRIGGER IF NOT EXISTS %s_au AFTER UPDATE ON %s BEGIN "
+                "%s %s END" % (fts, table, delete, insert),
+            "INSERT INTO %s(%s) VALUES ('rebuild')" % (fts, fts),
+        ]
+
+    def drop_ddl(self, module_class):
+        return ["DROP TABLE IF EXISTS %s" % self.get_table_name(module_class)]
+
+    def filter(self, module, query, search):
+        terms = tokenize(search)
+        if not terms:
+            return query
+        suffix = '*' if self.prefix else ''
+        match = ' '.join('"%s"%s' % (term, suffix) for term in terms)
+        fts = table(self.get_table_name(module))
+        rowids = select([literal_column('rowid')]).select_from(fts)\
+            .where(literal_column(fts.name).match(match))
+        return query.filter(module._primary_key.in_(rowids))
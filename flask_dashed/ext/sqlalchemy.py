@@ -1,15 +1,51 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import json
+import operator
+from hashlib import md5
+from itertools import chain
+from threading import Lock
+from time import time
 from werkzeug import OrderedMultiDict
-from flask import url_for
-from flask_dashed.admin import ObjectAdminModule
-from flask_dashed.views import ObjectFormView
-from sqlalchemy.sql.expression import or_
+from flask import url_for, has_request_context, session as http_session
+from flask import current_app, g, request
+from jinja2 import escape
+from flask_dashed.admin import ObjectAdminModule, ConflictError
+from flask_dashed.admin import lazy_class_attribute
+from flask_dashed.cache import LRUCache, get_counter, inc_counter
+from flask_dashed.views import ObjectFormView, ObjectLookupView
+from flask_dashed.ext.search import ContainsSearch, like_prefix
+from sqlalchemy import event, func, orm
+from sqlalchemy.sql.expression import and_, or_
+from wtforms import Field, ValidationError
+from wtforms.ext.sqlalchemy.fields import get_pk_from_identity
 from wtforms.ext.sqlalchemy.orm import model_form as mf
+from wtforms.ext.sqlalchemy.orm import ModelConverter, converts
+from wtforms.widgets import HTMLString, html_params
 from flask.ext.wtf import Form
 
 
+# Generated form classes by model and options
+_form_classes = {}
+_form_classes_lock = Lock()
+
+
+def _freeze(value):
+    """Returns hashable version of nested options.
+
+    :param value: The value
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item))
+            for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
 def model_form(*args, **kwargs):
     """Returns form class for model.
     """
@@ -18,28 +54,713 @@ def model_form(*args, **kwargs):
     return mf(*args, **kwargs)
 
 
+def _shared_model_form(*args, **kwargs):
+    """Returns form class for model, generated once by model and options
+    then shared by admin modules, so it must not be altered.
+    """
+    try:
+        key = _freeze((args, kwargs))
+        hash(key)
+    except TypeError:
+        return model_form(*args, **kwargs)
+    try:
+        return _form_classes[key]
+    except KeyError:
+        pass
+    with _form_classes_lock:
+        if key not in _form_classes:
+            _form_classes[key] = model_form(*args, **kwargs)
+        return _form_classes[key]
+
+
+class TypeaheadInput(object):
+    """Renders selected objects primary keys as hidden inputs along with a
+    search input querying field `lookup_url`.
+    """
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault('id', field.id)
+        kwargs.setdefault('autocomplete', 'off')
+        kwargs['class'] = ('typeahead-search %s' % kwargs.get('class',
+            '')).strip()
+        html = [u'<span %s>' % html_params(class_='typeahead', **{
+            'data-lookup-url': field.lookup_url or '',
+            'data-name': field.name,
+            'data-multiple': '1' if field.multiple else '',
+        })]
+        selected = field.get_selected()
+        if field.multiple:
+            html.append(u'<ul class="typeahead-selected">')
+            for pk, label in selected:
+                html.append(u'<li>%s<input %s /></li>' % (escape(label),
+                    html_params(type='hidden', name=field.name, value=pk)))
+            html.append(u'</ul>')
+            html.append(u'<input %s />' % html_params(type='text', **kwargs))
+        else:
+            pk, label = selected[0] if selected else (u'', u'')
+            html.append(u'<input %s />' % html_params(type='hidden',
+                name=field.name, value=pk))
+            html.append(u'<input %s />' % html_params(type='text',
+                value=label, **kwargs))
+        html.append(u'<ul class="typeahead-results"></ul></span>')
+        return HTMLString(u''.join(html))
+
+
+class TypeaheadField(Field):
+    """Related object field whose choices are looked up asynchronously from
+    `lookup_url`, only submitted primary keys are loaded and validated.
+
+    :param label: The label
+    :param validators: The validators
+    :param model: The related model
+    :param db_session: The session
+    :param get_label: The attribute name or function returning object label
+    :param allow_blank: Accepts no object
+    :param lookup_url: The lookup endpoint url, usually set by module
+    """
+    widget = TypeaheadInput()
+    multiple = False
+
+    def __init__(self, label=None, validators=None, model=None,
+            db_session=None, get_label=None, allow_blank=False,
+            lookup_url=None, **kwargs):
+        super(TypeaheadField, self).__init__(label, validators, **kwargs)
+        self.model = model
+        self.db_session = db_session
+        if get_label is None:
+            self.get_label = unicode
+        elif isinstance(get_label, basestring):
+            self.get_label = operator.attrgetter(get_label)
+        else:
+            self.get_label = get_label
+        self.allow_blank = allow_blank
+        self.lookup_url = lookup_url
+        self._formdata = None
+        self._invalid_formdata = False
+
+    @property
+    def primary_key(self):
+        return self.model.__mapper__.primary_key[0]
+
+    def load(self, pks):
+        """Returns objects by primary key, in a single query.
+
+        :param pks: The primary keys
+        """
+        if not pks:
+            return []
+        values = []
+        for pk in pks:
+            try:
+                values.append(self.primary_key.type.python_type(pk))
+            except NotImplementedError:
+                values.append(pk)
+            except ValueError:
+                pass
+        objects = dict((get_pk_from_identity(obj), obj) for obj in
+            self.db_session.query(self.model).filter(
+                self.primary_key.in_(values)))
+        return [objects[pk] for pk in pks if pk in objects]
+
+    def get_selected(self):
+        """Returns selected objects `(primary key, label)`.
+        """
+        data = self.data
+        objects = data if self.multiple else [] if data is None else [data]
+        return [(get_pk_from_identity(obj), self.get_label(obj))
+            for obj in objects]
+
+    def _get_data(self):
+        if self._formdata is not None:
+            objects = self.load(self._formdata)
+            self._invalid_formdata = len(objects) != len(self._formdata)
+            self._formdata = None
+            self._data = objects if self.multiple else\
+                (objects[0] if objects else None)
+        return self._data
+
+    def _set_data(self, data):
+        self._data = data
+        self._formdata = None
+
+    data = property(_get_data, _set_data)
+
+    def process_formdata(self, valuelist):
+        pks = []
+        for value in valuelist:
+            if value and value not in pks:
+                pks.append(value)
+        self._formdata = pks if self.multiple else pks[:1]
+
+    def pre_validate(self, form):
+        self.data
+        if self._invalid_formdata:
+            raise ValidationError(self.gettext('Not a valid choice'))
+        if not self.multiple and not self.allow_blank and self.data is None:
+            raise ValidationError(self.gettext('Not a valid choice'))
+
+
+class TypeaheadMultipleField(TypeaheadField):
+    """Same as `TypeaheadField` for collections, `data` being a list.
+    """
+    multiple = True
+
+    def __init__(self, label=None, validators=None, default=None, **kwargs):
+        super(TypeaheadMultipleField, self).__init__(label, validators,
+            default=default if default is not None else [], **kwargs)
+
+
+class LookupConverter(ModelConverter):
+    """Model converter rendering relationships listed in `lookup_fields`
+    as typeahead fields.
+
+    :param lookup_fields: The lookup options by relationship name
+    :param db_session: The session
+    """
+    def __init__(self, lookup_fields, db_session):
+        self.lookup_fields = lookup_fields
+        self.db_session = db_session
+        super(LookupConverter, self).__init__()
+
+    def __eq__(self, other):
+        return isinstance(other, LookupConverter) and\
+            self._key == other._key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key)
+
+    @property
+    def _key(self):
+        return (_freeze(self.lookup_fields), self.db_session)
+
+    def _typeahead(self, field_class, prop, field_args):
+        options = self.lookup_fields[prop.key]
+        field_args.pop('query_factory', None)
+        return field_class(model=prop.mapper.class_,
+            db_session=self.db_session, get_label=options.get('label', None),
+            **field_args)
+
+    @converts('MANYTOONE')
+    def conv_ManyToOne(self, field_args, prop=None, **extra):
+        if prop.key in self.lookup_fields:
+            return self._typeahead(TypeaheadField, prop, field_args)
+        return super(LookupConverter, self).conv_ManyToOne(
+            field_args=field_args, prop=prop, **extra)
+
+    @converts('MANYTOMANY', 'ONETOMANY')
+    def conv_ManyToMany(self, field_args, prop=None, **extra):
+        if prop.key in self.lookup_fields:
+            field_args.pop('allow_blank', None)
+            return self._typeahead(TypeaheadMultipleField, prop, field_args)
+        return super(LookupConverter, self).conv_ManyToMany(
+            field_args=field_args, prop=prop, **extra)
+
+
+# Eager loading strategies by name
+LOADERS = {
+    'joined': 'joinedload',
+    'subquery': 'subqueryload',
+    'selectin': 'selectinload',
+    'contains': 'contains_eager',
+    'lazy': 'lazyload',
+    'default': 'defaultload',
+}
+
+# Default strategy for collections
+COLLECTION_LOADING = 'selectin' if hasattr(orm, 'selectinload')\
+    else 'subquery'
+
+
+def get_read_session(db_session, read_session=None, window=5):
+    """Returns `read_session` (a replica one) unless current user committed
+    changes less than `window` seconds ago, so that users read their own
+    writes. Dashboard widgets may use it for their aggregates::
+
+        def render(self):
+            session = get_read_session(db.session, replica_session)
+
+    :param db_session: The primary session
+    :param read_session: The replica session
+    :param window: The read your writes window in seconds
+    """
+    if read_session is None:
+        return db_session
+    if has_request_context() and\
+            time() - http_session.get('_dashed_written_at', 0) < window:
+        return db_session
+    return read_session
+
+
+def record_write():
+    """Starts current user read your writes window.
+    """
+    if has_request_context():
+        http_session['_dashed_written_at'] = time()
+
+
+def get_pool_status(engine):
+    """Returns engine connection pool `size`, `checkedin`, `checkedout` and
+    `overflow` counters, as far as the pool class provides them.
+
+    :param engine: The SQLAlchemy engine
+    """
+    pool = engine.pool
+    status = {'class': pool.__class__.__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if method is not None:
+            status[name] = method()
+    return status
+
+
+class UnitOfWork(object):
+    """Scopes sessions to admin requests. Scoped sessions are only created
+    on first use, GET requests to views flagged `read_only` (lists,
+    dashboards, exports, lookups) must not flush and run read only
+    transactions on PostgreSQL, then sessions are released when requests
+    are torn down.
+
+    Statistics of each admin request (`endpoint`, `read_only`, released
+    `sessions`, connection `checkouts` and `pools` status) are passed to
+    `on_stats`::
+
+        UnitOfWork(admin, engines=[db.engine], on_stats=statsd.report)
+
+    :param admin: The admin object
+    :param sessions: The (usually scoped) sessions to release, defaults to
+        registered modules `db_session` and `read_session`
+    :param engines: The engines whose connections and pools are reported
+    :param on_stats: A function called with request statistics
+    """
+    def __init__(self, admin=None, sessions=None, engines=(),
+            on_stats=None):
+        self.sessions = list(sessions) if sessions is not None else None
+        self.on_stats = on_stats
+        self.engines = []
+        for engine in engines:
+            self.instrument_engine(engine)
+        if admin is not None:
+            self.init_admin(admin)
+
+    def init_admin(self, admin):
+        """Scopes sessions to admin requests.
+
+        :param admin: The admin object
+        """
+        self.admin = admin
+        admin.unit_of_work = self
+        admin.app.before_request_funcs.setdefault(admin.endpoint, [])\
+            .append(self.start_request)
+        admin.app.teardown_request_funcs.setdefault(admin.endpoint, [])\
+            .append(self.end_request)
+        event.listen(orm.Session, 'before_flush', self._before_flush)
+        event.listen(orm.Session, 'after_begin', self._after_begin)
+
+    def instrument_engine(self, engine):
+        """Counts engine connection checkouts within admin requests.
+
+        :param engine: The SQLAlchemy engine
+        """
+        def checkout(dbapi_connection, connection_record, connection_proxy):
+            if has_request_context() and hasattr(g, '_dashed_checkouts'):
+                g._dashed_checkouts += 1
+
+        event.listen(engine, 'checkout', checkout)
+        self.engines.append(engine)
+
+    def get_sessions(self):
+        """Returns released sessions.
+        """
+        if self.sessions is not None:
+            return self.sessions
+        sessions = []
+        for node in self.admin._nodes_by_endpoint.values():
+            for name in ('db_session', 'read_session'):
+                session = getattr(node, name, None)
+                if session is not None and session not in sessions:
+                    sessions.append(session)
+        return sessions
+
+    def is_read_only(self):
+        """Returns whether current request must not write.
+        """
+        return has_request_context() and\
+            getattr(g, '_dashed_read_only', False)
+
+    def start_request(self):
+        view = current_app.view_functions.get(request.endpoint)
+        g._dashed_read_only = request.method in ('GET', 'HEAD') and\
+            getattr(view, 'read_only', False)
+        g._dashed_checkouts = 0
+
+    def end_request(self, exception=None):
+        released = 0
+        for session in self.get_sessions():
+            if isinstance(session, orm.scoped_session):
+                if not session.registry.has():
+                    continue
+                session.remove()
+            else:
+                session.close()
+            released += 1
+        if self.on_stats is not None:
+            self.on_stats({
+                'endpoint': request.endpoint,
+                'read_only': getattr(g, '_dashed_read_only', False),
+                'sessions': released,
+                'checkouts': getattr(g, '_dashed_checkouts', 0),
+                'pools': [get_pool_status(engine) for engine
+                    in self.engines],
+            })
+
+    def _is_managed(self, session):
+        for managed in self.get_sessions():
+            if isinstance(managed, orm.scoped_session):
+                if managed.registry.has() and managed.registry() is session:
+                    return True
+            elif managed is session:
+                return True
+        return False
+
+    def _before_flush(self, session, flush_context, instances):
+        if self.is_read_only() and (session.new or session.deleted or
+                any(session.is_modified(obj) for obj in session.dirty))\
+                and self._is_managed(session):
+            raise Exception('Read only admin requests must not write')
+
+    def _after_begin(self, session, transaction, connection):
+        if self.is_read_only() and connection.dialect.name == 'postgresql'\
+                and self._is_managed(session):
+            connection.execute('SET TRANSACTION READ ONLY')
+
+
+class TableVersions(object):
+    """Tables change counters, incremented when sessions commit changes to
+    mapped objects or bulk statements. Changes made out of SQLAlchemy
+    sessions aren't counted.
+
+    Counters start from random values (see `flask_dashed.cache.get_counter`)
+    and deployments running several processes need a shared cache backend.
+
+    :param cache: A werkzeug cache object
+    """
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else\
+            LRUCache(threshold=10000, default_timeout=86400)
+        self._listening = False
+
+    def listen(self):
+        """Starts counting changes of all sessions.
+        """
+        if self._listening:
+            return
+        self._listening = True
+        event.listen(orm.Session, 'after_flush', self._after_flush)
+        event.listen(orm.Session, 'after_bulk_update', self._after_bulk)
+        event.listen(orm.Session, 'after_bulk_delete', self._after_bulk)
+        event.listen(orm.Session, 'after_commit', self._after_commit)
+        event.listen(orm.Session, 'after_rollback', self._after_rollback)
+
+    def get_key(self, table):
+        """Returns counter cache key.
+
+        :param table: The table
+        """
+        return 'flask_dashed.table_version:%s' % table.fullname
+
+    def get(self, tables):
+        """Returns tables counters.
+
+        :param tables: The tables
+        """
+        return tuple(get_counter(self.cache, self.get_key(table))
+            for table in tables)
+
+    def bump(self, tables):
+        """Increments tables counters.
+
+        :param tables: The tables
+        """
+        for table in tables:
+            inc_counter(self.cache, self.get_key(table))
+
+    def _changed(self, session):
+        return session.info.setdefault('_dashed_changed_tables', set())
+
+    def _after_flush(self, session, flush_context):
+        changed = self._changed(session)
+        for obj in chain(session.new, session.dirty, session.deleted):
+            changed.update(orm.object_mapper(obj).tables)
+
+    def _after_bulk(self, session, query, query_context, result):
+        entity = query.column_descriptions[0]['type']
+        self._changed(session).update(orm.class_mapper(entity).tables)
+
+    def _after_commit(self, session):
+        changed = session.info.pop('_dashed_changed_tables', None)
+        if changed:
+            self.bump(changed)
+
+    def _after_rollback(self, session):
+        session.info.pop('_dashed_changed_tables', None)
+
+
 class ModelAdminModule(ObjectAdminModule):
     """SQLAlchemy model admin module builder.
     """
     model = None
     form_view = ObjectFormView
-    form_class = None
     db_session = None
+    # Loading strategies by relationship path (eg: {'profile.company':
+    # 'joined'}), derived from fields when None
+    list_eager_loading = None
+    # Loads only list fields columns and keys of listed objects, other
+    # columns being deferred
+    list_projection = False
+    # See `flask_dashed.ext.search`
+    search_strategy = ContainsSearch()
+    # Rows fetched per round trip while exporting
+    export_batch_size = 1000
+    # Actions executed as single UPDATE or DELETE statements, `values` being
+    # updated ones, `delete` deleting objects without ORM cascades (secured
+    # as `delete` endpoint), none by default, eg: OrderedMultiDict((
+    # ('delete', {'label': 'delete', 'delete': True}),))
+    bulk_actions = None
+    # Primary keys per bulk statement
+    bulk_chunk_size = 500
+    # Relationships rendered as typeahead fields by name with `search`
+    # (searched columns names), `label` (attribute name or function) and
+    # `per_page` options, eg: {'author': {'search': ['name']}}
+    lookup_fields = None
+    lookup_view = ObjectLookupView
+    lookup_per_page = 20
+    # Replica session for lists, counts, exports and lookups, None reads from
+    # `db_session` which still saves, deletes and fetches edited objects
+    read_session = None
+    # Seconds reads of a user go to `db_session` after a commit
+    read_your_writes = 5
+    # Optimistic locking, either the name of an integer column incremented
+    # on every save or `version_hash` comparing all columns values
+    version_column = None
+    version_hash = False
+    # Answers list and edit pages conditional requests from model and
+    # related tables counters
+    conditional_get = False
+    # Tables counters
+    table_versions = TableVersions()
+    # Name of an indexed datetime column whose maximum is sent as
+    # `Last-Modified` when `conditional_get` is enabled, deletions don't
+    # change it so that requests are only validated by ETag
+    last_modified_column = None
 
     def __new__(cls, *args, **kwargs):
         if not cls.model:
             raise Exception('ModelAdminModule must provide `model` attribute')
-        if not cls.list_fields:
-            cls.list_fields = OrderedMultiDict()
-            for column in cls.model.__table__._columns:
-                cls.list_fields[column.name] = {'label': column.name,
-                    'column': getattr(cls.model, column.name)}
-        if not cls.form_class:
-            cls.form_class = model_form(cls.model, cls.db_session)
+        cls.search_strategy.prepare(cls)
+        if cls.conditional_get:
+            cls.table_versions.listen()
         return super(ModelAdminModule, cls).__new__(cls, *args, **kwargs)
 
+    @lazy_class_attribute
+    def list_fields(cls):
+        """All model table columns unless overridden.
+        """
+        list_fields = OrderedMultiDict()
+        for column in cls.model.__table__._columns:
+            list_fields[column.name] = {'label': column.name,
+                'column': getattr(cls.model, column.name)}
+        return list_fields
+
+    @lazy_class_attribute
+    def form_class(cls):
+        """Model form unless overridden.
+        """
+        kwargs = {}
+        if cls.lookup_fields:
+            kwargs['converter'] = LookupConverter(cls.lookup_fields,
+                cls.db_session)
+        if cls.version_column:
+            kwargs['exclude'] = [cls.version_column]
+        return _shared_model_form(cls.model, cls.db_session, **kwargs)
+
+    @property
+    def default_rules(self):
+        return super(ModelAdminModule, self).default_rules + [
+            ('/lookup/<field>', 'lookup', self.lookup_view.as_view(
+                'short_title', self)),
+        ]
+
+    def get_form(self, obj, formdata=None):
+        form = super(ModelAdminModule, self).get_form(obj, formdata)
+        for field in form:
+            if isinstance(field, TypeaheadField) and field.lookup_url is None\
+                    and field.name in (self.lookup_fields or {}):
+                field.lookup_url = url_for('%s.%s_lookup' % (
+                    self.admin.endpoint, self.endpoint), field=field.name)
+        return form
+
+    def lookup(self, field, search=None, page=1):
+        """Returns a page of `(primary key, label)` of objects related
+        through `field` relationship whose search columns start with search
+        string, and whether more objects follow.
+
+        :param field: The relationship name
+        :param search: The search string
+        :param page: The page index
+        """
+        options = self.lookup_fields[field]
+        model = self.model.__mapper__.relationships[field].mapper.class_
+        columns = [getattr(model, name) for name in options.get('search', [])]
+        per_page = options.get('per_page', self.lookup_per_page)
+        query = self.get_read_session().query(model)
+        if search and columns:
+            pattern = like_prefix(search)
+            query = query.filter(or_(*[column.like(pattern, escape='\\')
+                for column in columns]))
+        query = query.order_by(*(columns or model.__mapper__.primary_key))
+        objects = query.offset(per_page * (page - 1)).limit(per_page + 1)\
+            .all()
+        return [(get_pk_from_identity(obj), self.get_lookup_label(field, obj))
+            for obj in objects[:per_page]], len(objects) > per_page
+
+    def get_lookup_label(self, field, obj):
+        """Returns related object label.
+
+        :param field: The relationship name
+        :param obj: The related object
+        """
+        label = self.lookup_fields[field].get('label', None)
+        if label is None:
+            return unicode(obj)
+        if isinstance(label, basestring):
+            return unicode(getattr(obj, label))
+        return label(obj)
+
+    @lazy_class_attribute
+    def _eager_loading(cls):
+        return cls._plan_eager_loading()
+
+    @lazy_class_attribute
+    def _version_tables(cls):
+        """Model table, related ones and those crossed by eager loaded
+        paths.
+        """
+        mapper = cls.model.__mapper__
+        tables = set(mapper.tables)
+        for relationship in mapper.relationships:
+            tables.update(relationship.mapper.tables)
+        for path, strategy in cls._eager_loading:
+            mapper = cls.model.__mapper__
+            for name in path:
+                mapper = mapper.relationships[name].mapper
+                tables.update(mapper.tables)
+        return sorted(tables, key=lambda table: table.fullname)
+
+    @lazy_class_attribute
+    def _list_projection(cls):
+        return cls._plan_list_projection()
+
+    def warm_up(self):
+        super(ModelAdminModule, self).warm_up()
+        self._eager_loading
+        self._list_projection
+        self._version_tables
+        orm.configure_mappers()
+
+    @classmethod
+    def _plan_eager_loading(cls):
+        """Returns relationship paths (as tuples) and their loading strategy,
+        ordered by depth.
+
+        Relationships crossed by dotted list, searchable and ordering fields
+        are loaded along with the list: scalar ones are joined (explicitly
+        when the field has a column so that it may be searched and ordered
+        by), collections are loaded by a second query. Fields whose column
+        belongs to an aliased entity are left to `list_query_factory`.
+        """
+        if cls.list_eager_loading is not None:
+            plan = dict((tuple(path.split('.')), strategy) for path, strategy
+                in dict(cls.list_eager_loading or {}).items())
+            return sorted(plan.items(), key=lambda item: len(item[0]))
+        plan = {}
+        fields = list(cls.list_fields)
+        fields.extend(cls.searchable_fields or [])
+        if cls.order_by:
+            fields.append(cls.order_by[0])
+        for field in fields:
+            column = cls.list_fields.get(field, {}).get('column', None)
+            mapper, steps = cls.model.__mapper__, []
+            for name in field.split('.')[:-1]:
+                if name not in mapper.relationships:
+                    break
+                relationship = mapper.relationships[name]
+                steps.append((name, relationship.uselist))
+                mapper = relationship.mapper
+            if not steps or (column is not None and
+                    getattr(column, 'class_', None) is not mapper.class_):
+                continue
+            path, scalar = (), True
+            for name, uselist in steps:
+                path += (name,)
+                scalar = scalar and not uselist
+                if uselist:
+                    strategy = COLLECTION_LOADING
+                elif scalar and column is not None:
+                    strategy = 'contains'
+                else:
+                    strategy = 'joined'
+                if plan.get(path, None) != 'contains':
+                    plan[path] = strategy
+        return sorted(plan.items(), key=lambda item: len(item[0]))
+
+    @classmethod
+    def _plan_list_projection(cls):
+        """Returns loaded column attributes names by relationship path (as
+        tuples, the model being the empty one) when `list_projection` is
+        enabled. Primary keys and foreign keys of crossed relationships are
+        always loaded, paths whose fields aren't all columns are fully
+        loaded (None).
+        """
+        if not cls.list_projection:
+            return {}
+
+        def keys(mapper, columns):
+            return set(mapper.get_property_by_column(column).key
+                for column in columns)
+
+        projection = {(): keys(cls.model.__mapper__,
+            cls.model.__mapper__.primary_key)}
+        for field in cls.list_fields:
+            mapper, path = cls.model.__mapper__, ()
+            names = field.split('.')
+            for index, name in enumerate(names):
+                loaded = projection[path]
+                if name in mapper.relationships:
+                    relationship = mapper.relationships[name]
+                    if loaded is not None:
+                        loaded.update(keys(mapper,
+                            relationship.local_columns))
+                    mapper, path = relationship.mapper, path + (name,)
+                    projection.setdefault(path, keys(mapper,
+                        mapper.primary_key))
+                    if index == len(names) - 1:
+                        # Related objects are displayed as a whole
+                        projection[path] = None
+                elif name in mapper.column_attrs:
+                    if loaded is not None:
+                        loaded.add(name)
+                    break
+                else:
+                    projection[path] = None
+                    break
+        return dict((path, sorted(loaded)) for path, loaded
+            in projection.items() if loaded is not None)
+
     def get_object_list(self, search=None, order_by_name=None,
-            order_by_direction=None, offset=None, limit=None):
+            order_by_direction=None, offset=None, limit=None, after=None,
+            before=None):
         """Returns ordered, filtered and limited query.
 
         :param search: The string for search filter
@@ -47,22 +768,18 @@ class ModelAdminModule(ObjectAdminModule):
         :param order_by_direction: The field direction
         :param offset: The offset position
         :param limit: The limit
+        :param after: The primary key of the object preceding the page
+        :param before: The primary key of the object following the page
         """
         limit = limit if limit else self.list_per_page
-        query = self._get_filtered_query(self.list_query_factory, search)
-        if not (order_by_name and order_by_direction)\
-                and self.order_by is not None:
-            order_by_name = self.order_by[0]
-            order_by_direction = self.order_by[1]
-        if order_by_name and order_by_direction:
-            try:
-                query = query.order_by(
-                    getattr(self.list_fields[order_by_name]['column'],
-                        order_by_direction)()
-                )
-            except KeyError:
-                raise Exception('Order by field must be provided in ' +
-                    'list_fields with a column key')
+        query = self._get_filtered_query(self._get_list_query(), search)
+        column, direction = self._get_ordering(order_by_name,
+            order_by_direction)
+        if self.list_pagination == 'keyset':
+            return self._get_keyset_list(query, column, direction, limit,
+                after=after, before=before)
+        if column is not None:
+            query = query.order_by(getattr(column, direction)())
         return query.limit(limit).offset(offset).all()
 
     def count_list(self, search=None):
@@ -70,12 +787,59 @@ class ModelAdminModule(ObjectAdminModule):
 
         :param search: The string for quick search
         """
-        query = self._get_filtered_query(self.list_query_factory, search)
+        query = self._get_filtered_query(
+            self._get_list_query(eager=False), search)
         return query.count()
 
+    def estimate_count(self, search=None):
+        """Returns PostgreSQL planner row estimate for filtered list, falls
+        back on exact count for other databases.
+
+        :param search: The string for quick search
+        """
+        query = self._get_filtered_query(
+            self._get_list_query(eager=False), search)
+        connection = query.session.connection(mapper=self.model.__mapper__)
+        if connection.dialect.name != 'postgresql':
+            return query.count()
+        statement = query.statement.compile(dialect=connection.dialect)
+        plan = connection.execute('EXPLAIN (FORMAT JSON) %s' % statement,
+            statement.params).scalar()
+        if isinstance(plan, basestring):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def iter_export_objects(self, search=None, order_by_name=None,
+            order_by_direction=None):
+        """Returns filtered and ordered query fetching objects by batches of
+        `export_batch_size` through a server side cursor when database
+        supports it. Collections aren't eager loaded as it wouldn't work
+        with partial fetches.
+
+        :param search: The string for search filter
+        :param order_by_name: The field name to order by
+        :param order_by_direction: The field direction
+        """
+        query = self._get_filtered_query(
+            self._get_list_query(collections=False), search)
+        column, direction = self._get_ordering(order_by_name,
+            order_by_direction)
+        if column is not None:
+            query = query.order_by(getattr(column, direction)())
+        return query.execution_options(stream_results=True)\
+            .yield_per(self.export_batch_size)
+
+    def get_read_session(self):
+        """Returns session for list, count, export and lookup queries.
+        """
+        return get_read_session(self.db_session, self.read_session,
+            self.read_your_writes)
+
     @property
     def list_query_factory(self):
-        """Returns non filtered list query.
+        """Returns non filtered list query. Overriding factories must join
+        relationships crossed by list fields having a column (see
+        `_plan_eager_loading`).
         """
         return self.db_session.query(self.model)
 
@@ -93,12 +857,19 @@ class ModelAdminModule(ObjectAdminModule):
         return [
             ('edit', 'edit', 'Edit object', url_for(
                 "%s.%s_edit" % (self.admin.blueprint.name, self.endpoint),
-                pk=object.id)),
+                pk=self.get_object_pk(object))),
             ('delete', 'delete', 'Delete object', url_for(
                 "%s.%s_delete" % (self.admin.blueprint.name, self.endpoint),
-                pk=object.id)),
+                pk=self.get_object_pk(object))),
         ]
 
+    def get_object_pk(self, obj):
+        """Returns object primary key value.
+
+        :param obj: The object
+        """
+        return getattr(obj, self._primary_key.key)
+
     def get_object(self, pk):
         """Gets back object by primary key.
 
@@ -111,13 +882,107 @@ class ModelAdminModule(ObjectAdminModule):
         """New object instance new object."""
         return self.model()
 
-    def save_object(self, obj):
-        """Saves object.
+    def get_data_version(self):
+        """Returns model and related tables counters when `conditional_get`
+        is enabled.
+        """
+        if not self.conditional_get:
+            return None
+        return self.table_versions.get(self._version_tables)
+
+    def get_list_generation(self):
+        """Returns model and related tables generations, kept in
+        `list_cache` so that list contents are discarded by changes
+        committed through any module of any process sharing it.
+        """
+        return tuple(get_counter(self.list_cache,
+            self._get_table_generation_key(table))
+            for table in self._version_tables)
+
+    def invalidate_list_cache(self):
+        """Starts a new generation of model tables in list caches of all
+        admin modules, even when this module doesn't cache its list, other
+        modules may.
+        """
+        caches = []
+        for node in self.admin._nodes_by_endpoint.values():
+            cache = getattr(node, 'list_cache', None)
+            if cache is not None and not any(cache is c for c in caches):
+                caches.append(cache)
+        for cache in caches:
+            for table in self.model.__mapper__.tables:
+                inc_counter(cache, self._get_table_generation_key(table))
+
+    def _get_table_generation_key(self, table):
+        return 'flask_dashed.list_generation:%s' % table.fullname
+
+    def get_last_modified(self):
+        """Returns `last_modified_column` maximum.
+        """
+        if not self.last_modified_column:
+            return None
+        return self.db_session.query(func.max(getattr(self.model,
+            self.last_modified_column))).scalar()
+
+    def get_object_version(self, obj):
+        """Returns `version_column` value or columns values hash, None for
+        new objects or when versioning is disabled.
+
+        :param obj: The object
+        """
+        if not (self.version_column or self.version_hash) or\
+                self.get_object_pk(obj) is None:
+            return None
+        if self.version_column:
+            return unicode(getattr(obj, self.version_column))
+        return self._hash_values([getattr(obj, attribute.key)
+            for attribute in self.model.__mapper__.column_attrs])
+
+    def _hash_values(self, values):
+        return md5(repr(tuple(values))).hexdigest()
+
+    def _get_stored_version(self, obj):
+        """Returns object version as currently stored, locking its row until
+        the end of the save transaction.
+
+        :param obj: The object
+        """
+        if self.version_column:
+            columns = [getattr(self.model, self.version_column)]
+        else:
+            columns = [getattr(self.model, attribute.key)
+                for attribute in self.model.__mapper__.column_attrs]
+        with self.db_session.no_autoflush:
+            values = self.db_session.query(*columns)\
+                .filter(self._primary_key == self.get_object_pk(obj))\
+                .with_for_update().first()
+        if values is None:
+            return None
+        if self.version_column:
+            return unicode(values[0])
+        return self._hash_values(values)
+
+    def save_object(self, obj, version=None):
+        """Saves object. When versioned and `version` is given, stored
+        version is compared then object saved in the same transaction.
+        `version_column` is incremented on every save of existing objects.
 
         :param object: The object to save
+        :param version: The object version when form was rendered
         """
+        if (version is not None and self.version_hash) or\
+                (self.version_column and
+                self.get_object_pk(obj) is not None):
+            stored = self._get_stored_version(obj)
+            if version is not None and stored != version:
+                self.db_session.rollback()
+                raise ConflictError()
+            if self.version_column and stored is not None:
+                setattr(obj, self.version_column, int(stored) + 1)
         self.db_session.add(obj)
         self.db_session.commit()
+        record_write()
+        self.invalidate_list_cache()
 
     def delete_object(self, object):
         """Deletes object.
@@ -126,26 +991,214 @@ class ModelAdminModule(ObjectAdminModule):
         """
         self.db_session.delete(object)
         self.db_session.commit()
+        record_write()
+        self.invalidate_list_cache()
+
+    @classmethod
+    def get_search_columns(cls):
+        """Returns columns of searchable fields.
+        """
+        columns = []
+        for field in cls.searchable_fields or []:
+            if field in cls.list_fields\
+                    and 'column' in cls.list_fields[field]:
+                columns.append(cls.list_fields[field]['column'])
+            else:
+                raise Exception('Searchables fields must be in ' +
+                    'list_fields with specified column.')
+        return columns
+
+    def execute_bulk_action(self, name, pks=None, search=None):
+        """Executes bulk action as set based statements on chunks of
+        `bulk_chunk_size` primary keys, all in one transaction.
+
+        :param name: The bulk action name
+        :param pks: The selected object primary keys
+        :param search: The string for quick search
+        """
+        action = self.bulk_actions[name]
+        values = dict(action.get('values', {}))
+        if self.version_column:
+            values[self.version_column] = getattr(self.model,
+                self.version_column) + 1
+        count = 0
+        try:
+            for chunk in self._iter_bulk_chunks(pks, search):
+                query = self.db_session.query(self.model)\
+                    .filter(self._primary_key.in_(chunk))
+                if action.get('delete', False):
+                    count += query.delete(synchronize_session=False)
+                else:
+                    count += query.update(values,
+                        synchronize_session=False)
+            self.db_session.commit()
+        except:
+            self.db_session.rollback()
+            raise
+        record_write()
+        self.invalidate_list_cache()
+        return count
+
+    def _iter_bulk_chunks(self, pks=None, search=None):
+        """Yields primary key chunks, seeking through filtered list when
+        `pks` is None.
+
+        :param pks: The selected object primary keys
+        :param search: The string for quick search
+        """
+        size = self.bulk_chunk_size
+        if pks is not None:
+            for index in xrange(0, len(pks), size):
+                yield pks[index:index + size]
+            return
+        primary_key = self._primary_key
+        query = self._get_filtered_query(self._get_list_query(eager=False,
+            read=False), search).with_entities(primary_key)\
+            .order_by(primary_key)
+        last = None
+        while True:
+            page = query if last is None else\
+                query.filter(primary_key > last)
+            chunk = [row[0] for row in page.limit(size)]
+            if not chunk:
+                break
+            yield chunk
+            last = chunk[-1]
 
     def _get_filtered_query(self, query, search=None):
-        """Filters query.
+        """Filters query according to `search_strategy`.
 
         :param query: The non filtered query
         :param search: The string for quick search
         """
         if search and self.searchable_fields:
-            condition = None
-            for field in self.searchable_fields:
-                if field in self.list_fields\
-                        and 'column' in self.list_fields[field]:
-                    if condition is None:
-                        condition = self.list_fields[field]['column'].\
-                            contains(search)
-                    else:
-                        condition = or_(condition, self.\
-                            list_fields[field]['column'].contains(search))
-                else:
-                    raise Exception('Searchables fields must be in ' +
-                        'list_fields with specified column.')
-            query = query.filter(condition)
+            query = self.search_strategy.filter(self, query, search)
         return query
+
+    def _get_list_query(self, eager=True, collections=True, read=True):
+        """Returns `list_query_factory` with eager loading options, the
+        default factory being joined to relationships loaded with `contains`
+        strategy; overriding factories must join them.
+
+        :param eager: Apply eager loading options
+        :param collections: Eager load collections
+        :param read: Routes query to `get_read_session`
+        """
+        query = self.list_query_factory
+        if read and self.read_session is not None:
+            session = self.get_read_session()
+            if isinstance(session, orm.scoped_session):
+                session = session()
+            query = query.with_session(session)
+        auto_join = type(self).list_query_factory is\
+            ModelAdminModule.list_query_factory
+        joined = set()
+        leaves = []
+        for path, strategy in self._eager_loading:
+            if not collections and strategy in ('subquery', 'selectin'):
+                continue
+            if strategy == 'contains' and auto_join:
+                mapper = self.model.__mapper__
+                for name in path[:-1]:
+                    mapper = mapper.relationships[name].mapper
+                target = mapper.relationships[path[-1]].mapper
+                if target not in joined:
+                    query = query.outerjoin(getattr(mapper.class_,
+                        path[-1]))
+                    joined.add(target)
+            leaves = [leaf for leaf in leaves if leaf != path[:len(leaf)]]
+            leaves.append(path)
+        if eager:
+            plan = dict(self._eager_loading)
+            for path in leaves:
+                loader = orm
+                for depth in range(len(path)):
+                    strategy = plan.get(path[:depth + 1], 'default')
+                    loader = getattr(loader, LOADERS[strategy])(path[depth])
+                query = query.options(loader)
+            for path, keys in self._list_projection.items():
+                loader = orm
+                for name in path:
+                    loader = loader.defaultload(name)
+                query = query.options(loader.load_only(*keys))
+        return query
+
+    @property
+    def _primary_key(self):
+        """Returns model primary key attribute.
+        """
+        mapper = self.model.__mapper__
+        return getattr(self.model,
+            mapper.get_property_by_column(mapper.primary_key[0]).key)
+
+    def _get_ordering(self, order_by_name=None, order_by_direction=None):
+        """Returns ordering column and direction, falling back on
+        `order_by`.
+
+        :param order_by_name: The field name to order by
+        :param order_by_direction: The field direction
+        """
+        if not (order_by_name and order_by_direction)\
+                and self.order_by is not None:
+            order_by_name = self.order_by[0]
+            order_by_direction = self.order_by[1]
+        if order_by_name and order_by_direction:
+            try:
+                return self.list_fields[order_by_name]['column'],\
+                    order_by_direction
+            except KeyError:
+                raise Exception('Order by field must be provided in ' +
+                    'list_fields with a column key')
+        return None, None
+
+    def _get_keyset_list(self, query, column, direction, limit, after=None,
+            before=None):
+        """Returns objects following `after` cursor or preceding `before`
+        one, seeking on ordering column then on primary key so that deep
+        pages cost the same as the first one. Ordering column is expected
+        to be non nullable.
+
+        :param query: The filtered query
+        :param column: The ordering column
+        :param direction: The ordering direction
+        :param limit: The limit
+        :param after: The primary key of the object preceding the page
+        :param before: The primary key of the object following the page
+        """
+        primary_key = self._primary_key
+        if column is None or column is primary_key:
+            columns = [primary_key]
+        else:
+            columns = [column, primary_key]
+        reverse = before is not None
+        cursor = before if reverse else after
+        descending = (direction == 'desc') != reverse
+        if cursor is not None:
+            boundary = self._get_list_query(eager=False)\
+                .filter(primary_key == cursor)\
+                .with_entities(*columns).first()
+            if boundary is not None:
+                query = query.filter(self._get_keyset_condition(columns,
+                    list(boundary), descending))
+        query = query.order_by(*[getattr(c, 'desc' if descending else 'asc')()
+            for c in columns])
+        objects = query.limit(limit).all()
+        if reverse:
+            objects.reverse()
+        return objects
+
+    def _get_keyset_condition(self, columns, values, descending=False):
+        """Returns the condition matching rows located after `values`.
+        Redundant `>=` bound lets the database use an index range scan.
+
+        :param columns: The ordering columns
+        :param values: The cursor values
+        :param descending: The ordering direction
+        """
+        strict = operator.lt if descending else operator.gt
+        column, value = columns[0], values[0]
+        if len(columns) == 1:
+            return strict(column, value)
+        large = operator.le if descending else operator.ge
+        return and_(large(column, value), or_(strict(column, value),
+            self._get_keyset_condition(columns[1:], values[1:], descending)))
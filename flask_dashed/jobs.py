@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import json
+import os
+import sqlite3
+import threading
+import multiprocessing
+import traceback
+from time import time, sleep
+from uuid import uuid4
+from flask import url_for, render_template, has_request_context
+from flask_dashed.admin import AdminModule
+from flask_dashed.dashboard import DashboardWidget
+from flask_dashed.views import JobListView, JobStatusView, JobResultView
+from flask_dashed.views import EXPORT_FORMATS, iter_export
+
+
+class SQLiteJobStore(object):
+    """Job queue and status store backed by a local SQLite database, it may
+    be shared by threads and forked processes of the same host. Database and
+    result files are only readable by their owner.
+
+    :param path: The database file path, private to the application
+    :param results_path: The result files directory, defaults to a
+        `results` directory next to the database
+    """
+    columns = ('id', 'task', 'args', 'module', 'owner', 'status', 'progress',
+        'message', 'error', 'result_path', 'result_filename',
+        'result_mimetype', 'created', 'updated')
+
+    def __init__(self, path, results_path=None):
+        self.path = path
+        self.results_path = results_path or os.path.join(
+            os.path.dirname(os.path.abspath(path)), 'results')
+        for directory in (os.path.dirname(os.path.abspath(path)),
+                self.results_path):
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0700)
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0600))
+        with self._connect() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS flask_dashed_job (
+                id TEXT PRIMARY KEY, task TEXT NOT NULL, args TEXT NOT NULL,
+                module TEXT, owner TEXT,
+                status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0,
+                message TEXT, error TEXT, result_path TEXT,
+                result_filename TEXT, result_mimetype TEXT,
+                created REAL NOT NULL, updated REAL NOT NULL)""")
+            existing = [row['name'] for row in connection.execute(
+                'PRAGMA table_info(flask_dashed_job)')]
+            for name in ('module', 'owner'):
+                if name not in existing:
+                    connection.execute('ALTER TABLE flask_dashed_job '
+                        'ADD COLUMN %s TEXT' % name)
+            connection.execute("""CREATE INDEX IF NOT EXISTS
+                ix_flask_dashed_job_status ON flask_dashed_job
+                (status, created)""")
+
+    def _connect(self):
+        """Returns a new connection, connections aren't shared across
+        threads nor processes.
+        """
+        connection = sqlite3.connect(self.path, timeout=30,
+            isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return _Connection(connection)
+
+    def _to_job(self, row):
+        if row is None:
+            return None
+        job = dict(zip(row.keys(), row))
+        job['args'] = json.loads(job['args'])
+        return job
+
+    def create(self, task, args, module=None, owner=None):
+        """Queues a job and returns its id.
+
+        :param task: The task name
+        :param args: The JSON serializable task arguments
+        :param module: The endpoint of the admin module submitting the job
+        :param owner: The identity of the user submitting the job
+        """
+        job_id = uuid4().hex
+        now = time()
+        with self._connect() as connection:
+            connection.execute("""INSERT INTO flask_dashed_job
+                (id, task, args, module, owner, status, created, updated)
+                VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)""",
+                (job_id, task, json.dumps(list(args)), module, owner, now,
+                now))
+        return job_id
+
+    def claim(self):
+        """Marks oldest queued job as running and returns it, None when
+        queue is empty.
+        """
+        with self._connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute("""SELECT * FROM flask_dashed_job
+                    WHERE status = 'queued' ORDER BY created LIMIT 1"""
+                    ).fetchone()
+                if row is not None:
+                    connection.execute("""UPDATE flask_dashed_job
+                        SET status = 'running', updated = ? WHERE id = ?""",
+                        (time(), row['id']))
+                connection.execute('COMMIT')
+            except:
+                connection.execute('ROLLBACK')
+                raise
+        job = self._to_job(row)
+        if job is not None:
+            job['status'] = 'running'
+        return job
+
+    def update(self, job_id, **values):
+        """Updates job columns.
+
+        :param job_id: The job id
+        """
+        values['updated'] = time()
+        names = sorted(values)
+        for name in names:
+            if name not in self.columns:
+                raise ValueError('Unknown job column `%s`' % name)
+        with self._connect() as connection:
+            connection.execute("UPDATE flask_dashed_job SET %s WHERE id = ?" %
+                ', '.join('%s = ?' % name for name in names),
+                [values[name] for name in names] + [job_id])
+
+    def get(self, job_id):
+        """Returns job by id or None.
+
+        :param job_id: The job id
+        """
+        with self._connect() as connection:
+            return self._to_job(connection.execute(
+                "SELECT * FROM flask_dashed_job WHERE id = ?",
+                (job_id,)).fetchone())
+
+    def list(self, limit=50, owner=None):
+        """Returns latest jobs.
+
+        :param limit: The maximum job count
+        :param owner: Only returns jobs of this owner and ownerless ones
+        """
+        with self._connect() as connection:
+            if owner is None:
+                rows = connection.execute("""SELECT * FROM flask_dashed_job
+                    ORDER BY created DESC LIMIT ?""", (limit,))
+            else:
+                rows = connection.execute("""SELECT * FROM flask_dashed_job
+                    WHERE owner = ? OR owner IS NULL
+                    ORDER BY created DESC LIMIT ?""", (owner, limit))
+            return [self._to_job(row) for row in rows]
+
+    def get_result_path(self, job_id):
+        """Returns result file path for job.
+
+        :param job_id: The job id
+        """
+        return os.path.join(self.results_path, job_id)
+
+    def purge(self, age=86400):
+        """Deletes finished jobs older than age and their result files.
+
+        :param age: The age in seconds
+        """
+        with self._connect() as connection:
+            rows = connection.execute("""SELECT id, result_path
+                FROM flask_dashed_job WHERE status IN ('done', 'failed')
+                AND updated < ?""", (time() - age,)).fetchall()
+            for row in rows:
+                if row['result_path'] and os.path.exists(row['result_path']):
+                    os.remove(row['result_path'])
+                connection.execute("DELETE FROM flask_dashed_job WHERE id = ?",
+                    (row['id'],))
+        return len(rows)
+
+
+class _Connection(object):
+    """Closes sqlite connection on context exit.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+
+
+class JobContext(object):
+    """Passed to task functions as first argument to report progress and
+    write results.
+
+    :param runner: The job runner
+    :param job: The job
+    """
+    def __init__(self, runner, job):
+        self.runner = runner
+        self.job = job
+        self.id = job['id']
+
+    def progress(self, value, message=None):
+        """Reports job progress.
+
+        :param value: The progress between 0 and 1
+        :param message: The status message
+        """
+        self.runner.store.update(self.id, progress=value, message=message)
+
+    def track(self, iterable, total, every=500):
+        """Yields iterable items reporting progress every given items.
+
+        :param iterable: The iterable
+        :param total: The expected item count
+        :param every: The item count between reports
+        """
+        done = 0
+        for item in iterable:
+            yield item
+            done += 1
+            if total and not done % every:
+                self.progress(min(float(done) / total, 1.0),
+                    '%d / %d' % (done, total))
+
+    def open_result(self, filename, mimetype='application/octet-stream'):
+        """Returns writable job result file.
+
+        :param filename: The file name proposed on download
+        :param mimetype: The file mimetype
+        """
+        path = self.runner.store.get_result_path(self.id)
+        self.runner.store.update(self.id, result_path=path,
+            result_filename=filename, result_mimetype=mimetype)
+        return os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+            0600), 'wb')
+
+
+class JobsModule(AdminModule):
+    """Lists jobs and serves their status and results. Jobs are only shown to
+    their owner and to users allowed to run them from the submitting module.
+    """
+    # Submitting module endpoints by task
+    task_endpoints = {'export': 'export', 'bulk_action': 'bulk'}
+
+    @property
+    def runner(self):
+        return self.admin.job_runner
+
+    def get_jobs(self, view, limit=50):
+        """Returns latest jobs current user may see.
+
+        :param view: The view evaluating security functions
+        :param limit: The maximum job count
+        """
+        jobs = self.runner.store.list(limit, owner=self.runner.get_owner())
+        return [job for job in jobs if self.is_job_allowed(job, view)]
+
+    def is_job_allowed(self, job, view):
+        """Returns whether current user may see job.
+
+        :param job: The job
+        :param view: The view evaluating security functions
+        """
+        if job['owner'] is not None and\
+                job['owner'] != self.runner.get_owner():
+            return False
+        if job['module'] is None:
+            return True
+        module = self.admin.get_node(job['module'])
+        if module is None:
+            return False
+        return module.is_endpoint_allowed(self.task_endpoints.get(
+            job['task'], job['task']), view)
+
+    @property
+    def default_rules(self):
+        return [
+            ('/', 'list', JobListView.as_view('list', self)),
+            ('/<job_id>', 'status', JobStatusView.as_view('status', self)),
+            ('/<job_id>/result', 'result',
+                JobResultView.as_view('result', self)),
+        ]
+
+
+class JobsWidget(DashboardWidget):
+    """Dashboard widget showing latest jobs.
+
+    :param title: The widget title
+    :param runner: The job runner
+    :param limit: The job count
+    """
+    def __init__(self, title, runner, limit=5):
+        DashboardWidget.__init__(self, title)
+        self.runner = runner
+        self.limit = limit
+
+    def render(self):
+        return render_template('flask_dashed/jobs_widget.html',
+            runner=self.runner, jobs=self.runner.module.get_jobs(self,
+            self.limit))
+
+
+class JobRunner(object):
+    """Runs admin tasks out of request workers. Jobs are queued into `store`
+    and run by a pool of threads or forked processes polling it, status and
+    results are served by a `JobsModule`.
+
+    Object admin modules list actions to run through the runner in their
+    `background_actions`: `export` and `bulk`. Other tasks can be registered
+    with `task` decorator and queued with `submit`.
+
+    Forked worker processes dispose inherited connection pools of `engines`,
+    registered modules sessions ones by default.
+
+    :param admin: The admin object
+    :param store: The job store, defaults to a `SQLiteJobStore` in the
+        application instance folder
+    :param workers: The worker count, 0 lets caller run jobs with `run_next`
+    :param mode: The workers kind, `thread` or `process`
+    :param poll_interval: The delay between queue polls in seconds
+    :param url_prefix: The jobs module url prefix
+    :param endpoint: The jobs module endpoint
+    :param short_title: The jobs module short title
+    :param engines: The SQLAlchemy engines disposed by forked workers
+    """
+    def __init__(self, admin=None, store=None, workers=2, mode='thread',
+            poll_interval=0.5, url_prefix='/jobs', endpoint='jobs',
+            short_title='jobs', engines=None):
+        if mode not in ('thread', 'process'):
+            raise ValueError('`mode` must be `thread` or `process`')
+        self.store = store
+        self.engines = engines
+        self.workers = workers
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.url_prefix = url_prefix
+        self.endpoint = endpoint
+        self.short_title = short_title
+        self.tasks = {
+            'export': self._export,
+            'bulk_action': self._bulk_action,
+        }
+        self.module = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._stopped = None
+        if admin is not None:
+            self.init_admin(admin)
+
+    def init_admin(self, admin):
+        """Binds runner to admin and registers jobs module.
+
+        :param admin: The admin object
+        """
+        self.admin = admin
+        admin.job_runner = self
+        if self.store is None:
+            self.store = SQLiteJobStore(os.path.join(admin.app.instance_path,
+                'flask_dashed_jobs.db'))
+        self.module = admin.register_module(JobsModule, self.url_prefix,
+            self.endpoint, self.short_title)
+
+    def task(self, name):
+        """Registers decorated function as task, which is called with a
+        `JobContext` then submitted arguments.
+
+        :param name: The task name
+        """
+        def decorator(function):
+            self.tasks[name] = function
+            return function
+        return decorator
+
+    def submit(self, name, *args, **kwargs):
+        """Queues task and returns job id. Jobs submitted within requests
+        belong to current user.
+
+        :param name: The task name
+        :param module: The submitting admin module endpoint, whose security
+            applies to the job
+        """
+        if name not in self.tasks:
+            raise KeyError('Unknown task `%s`' % name)
+        job_id = self.store.create(name, args, module=kwargs.get('module'),
+            owner=self.get_owner())
+        if self.workers and not self._workers:
+            self.start()
+        return job_id
+
+    def start(self):
+        """Starts workers.
+        """
+        with self._lock:
+            if self._workers:
+                return
+            if self.mode == 'process':
+                self._stopped = multiprocessing.Event()
+                worker_class = multiprocessing.Process
+            else:
+                self._stopped = threading.Event()
+                worker_class = threading.Thread
+            for i in xrange(self.workers):
+                worker = worker_class(target=self._work,
+                    name='flask_dashed-job-%d' % i)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout=None):
+        """Stops workers once their current job is done.
+
+        :param timeout: The join timeout in seconds
+        """
+        with self._lock:
+            if self._stopped is not None:
+                self._stopped.set()
+            for worker in self._workers:
+                worker.join(timeout)
+            self._workers = []
+
+    def get_owner(self):
+        """Returns current user identity as job owner, None out of requests
+        or when admin permissions have no identity function.
+        """
+        identity = self.admin.permissions.identity
+        if identity is None or not has_request_context():
+            return None
+        owner = identity()
+        return unicode(owner) if owner is not None else None
+
+    def get_engines(self):
+        """Returns `engines`, registered modules sessions engines by
+        default.
+        """
+        if self.engines is not None:
+            return self.engines
+        engines = []
+        with self.admin.app.app_context():
+            for node in self.admin._nodes_by_endpoint.values():
+                model = getattr(node, 'model', None)
+                for name in ('db_session', 'read_session'):
+                    session = getattr(node, name, None)
+                    if model is None or session is None:
+                        continue
+                    engine = session.get_bind(mapper=model.__mapper__)
+                    if engine not in engines:
+                        engines.append(engine)
+        return engines
+
+    def _work(self):
+        if self.mode == 'process':
+            # Pooled connections inherited from parent process mustn't be
+            # shared
+            for engine in self.get_engines():
+                engine.dispose()
+        while not self._stopped.is_set():
+            if not self.run_next():
+                sleep(self.poll_interval)
+
+    def run_next(self):
+        """Runs oldest queued job, returns False when there is none.
+        """
+        job = self.store.claim()
+        if job is None:
+            return False
+        self.run(job)
+        return True
+
+    def run(self, job):
+        """Runs claimed job within a request context.
+
+        :param job: The job
+        """
+        context = JobContext(self, job)
+        try:
+            with self.admin.app.test_request_context():
+                message = self.tasks[job['task']](context, *job['args'])
+        except Exception:
+            self.store.update(job['id'], status='failed',
+                error=traceback.format_exc())
+        else:
+            self.store.update(job['id'], status='done', progress=1.0,
+                message=message)
+
+    def get_url(self, job_id=None, result=False):
+        """Returns jobs list url, job status or result url.
+
+        :param job_id: The job id
+        :param result: Returns result url
+        """
+        endpoint = 'list' if job_id is None else\
+            'result' if result else 'status'
+        values = {} if job_id is None else {'job_id': job_id}
+        return url_for('%s.%s_%s' % (self.admin.endpoint, self.endpoint,
+            endpoint), **values)
+
+    def _export(self, context, endpoint, format, search, order_by_name,
+            order_by_direction):
+        module = self.admin.get_node(endpoint)
+        mimetype, extension = EXPORT_FORMATS[format]
+        total = module.count_list(search=search)
+        objects = context.track(module.iter_export_objects(search=search,
+            order_by_name=order_by_name,
+            order_by_direction=order_by_direction), total)
+        result = context.open_result('%s.%s' % (endpoint, extension),
+            mimetype)
+        with result:
+            for chunk in iter_export(module, format, objects=objects):
+                if isinstance(chunk, unicode):
+                    chunk = chunk.encode('utf-8')
+                result.write(chunk)
+        return '%d objects exported' % total
+
+    def _bulk_action(self, context, endpoint, name, pks, search):
+        module = self.admin.get_node(endpoint)
+        count = module.execute_bulk_action(name, pks=pks, search=search)
+        return '%s applied to %d objects' % (
+            module.bulk_actions[name].get('label', name), count)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import time
+from flask import g, request, has_request_context, render_template
+
+
+def get_profile():
+    """Returns current request profile, None when request isn't profiled.
+    """
+    if not has_request_context():
+        return None
+    return getattr(g, '_dashed_profile', None)
+
+
+@contextmanager
+def phase(name):
+    """Times enclosed block as named phase of current request profile.
+
+    :param name: The phase name
+    """
+    profile = get_profile()
+    if profile is None:
+        yield
+        return
+    start = time()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, time() - start)
+
+
+class Profile(object):
+    """Request timings.
+
+    :param statement_limit: The maximum count of distinct recorded statements
+    """
+    def __init__(self, statement_limit=50):
+        self.start = time()
+        self.end = None
+        self.statement_limit = statement_limit
+        # Phase `[count, duration]` by name
+        self.phases = OrderedDict()
+        self.query_count = 0
+        self.query_duration = 0.
+        # Statement `[count, duration]` by SQL
+        self.statements = OrderedDict()
+
+    @property
+    def duration(self):
+        return (self.end or time()) - self.start
+
+    def add_phase(self, name, duration):
+        """Records phase duration.
+
+        :param name: The phase name
+        :param duration: The duration in seconds
+        """
+        timing = self.phases.setdefault(name, [0, 0.])
+        timing[0] += 1
+        timing[1] += duration
+
+    def add_query(self, statement, duration):
+        """Records SQL statement duration.
+
+        :param statement: The SQL statement
+        :param duration: The duration in seconds
+        """
+        self.query_count += 1
+        self.query_duration += duration
+        if statement in self.statements or\
+                len(self.statements) < self.statement_limit:
+            timing = self.statements.setdefault(statement, [0, 0.])
+            timing[0] += 1
+            timing[1] += duration
+
+    def get_server_timing(self):
+        """Returns `Server-Timing` header value.
+        """
+        metrics = ['%s;dur=%.2f' % (name.replace(' ', '-'), duration * 1000)
+            for name, (count, duration) in self.phases.iteritems()]
+        metrics.append('sql;desc="%d queries";dur=%.2f' % (self.query_count,
+            self.query_duration * 1000))
+        metrics.append('total;dur=%.2f' % (self.duration * 1000))
+        return ', '.join(metrics)
+
+
+class Profiler(object):
+    """Opt-in admin requests instrumentation: views phases (security,
+    count, list, form, save, delete, render) and SQL statements timings are
+    exposed as `Server-Timing` header and a panel appended to html pages.
+
+    :param admin: The admin object
+    :param engines: The SQLAlchemy engines to instrument
+    :param panel: Appends timings panel to html pages
+    :param server_timing: Adds `Server-Timing` header
+    :param enabled: A function telling whether current request is profiled
+    """
+    def __init__(self, admin=None, engines=(), panel=True,
+            server_timing=True, enabled=None):
+        self.panel = panel
+        self.server_timing = server_timing
+        self.enabled = enabled
+        self.engines = []
+        for engine in engines:
+            self.instrument_engine(engine)
+        if admin is not None:
+            self.init_admin(admin)
+
+    def init_admin(self, admin):
+        """Profiles admin requests.
+
+        :param admin: The admin object
+        """
+        self.admin = admin
+        admin.profiler = self
+        # Starts before admin security checks
+        admin.app.before_request_funcs.setdefault(None, []).insert(0,
+            self.start_request)
+        admin.app.after_request(self.end_request)
+
+    def instrument_engine(self, engine):
+        """Records SQL statements executed by engine within profiled
+        requests.
+
+        :param engine: The SQLAlchemy engine
+        """
+        from sqlalchemy import event
+
+        def before(conn, cursor, statement, parameters, context,
+                executemany):
+            if get_profile() is not None:
+                conn.info.setdefault('_dashed_query_start', []).append(time())
+
+        def after(conn, cursor, statement, parameters, context,
+                executemany):
+            profile = get_profile()
+            starts = conn.info.get('_dashed_query_start')
+            if profile is not None and starts:
+                profile.add_query(statement, time() - starts.pop())
+
+        event.listen(engine, 'before_cursor_execute', before)
+        event.listen(engine, 'after_cursor_execute', after)
+        self.engines.append(engine)
+
+    def is_enabled(self):
+        """Returns whether current request is profiled.
+        """
+        prefix = self.admin.url_prefix
+        if request.path != prefix and\
+                not request.path.startswith(prefix.rstrip('/') + '/'):
+            return False
+        return self.enabled is None or self.enabled()
+
+    def start_request(self):
+        if self.is_enabled():
+            g._dashed_profile = Profile()
+
+    def end_request(self, response):
+        profile = get_profile()
+        if profile is None:
+            return response
+        profile.end = time()
+        if self.server_timing:
+            response.headers['Server-Timing'] = profile.get_server_timing()
+        if self.panel and response.mimetype == 'text/html' and\
+                not response.is_streamed and response.status_code == 200:
+            data = response.data
+            index = data.rfind('</body>')
+            if index != -1:
+                panel = render_template('flask_dashed/profiler.html',
+                    profile=profile).encode('utf-8')
+                response.data = data[:index] + panel + data[index:]
+        return response
@@ -0,0 +1,83 @@
+/*
+ * Typeahead fields: looks related objects up while typing and stores
+ * selected primary keys in hidden inputs.
+ */
+(function () {
+    'use strict';
+
+    function lookup(url, search, callback) {
+        var xhr = new XMLHttpRequest();
+        xhr.onload = function () {
+            if (xhr.status === 200) {
+                callback(JSON.parse(xhr.responseText));
+            }
+        };
+        xhr.open('GET', url + (url.indexOf('?') === -1 ? '?' : '&') +
+            'q=' + encodeURIComponent(search));
+        xhr.send();
+    }
+
+    function bind(holder) {
+        var url = holder.getAttribute('data-lookup-url'),
+            multiple = holder.getAttribute('data-multiple') === '1',
+            search = holder.querySelector('.typeahead-search'),
+            results = holder.querySelector('.typeahead-results'),
+            selected = holder.querySelector('.typeahead-selected'),
+            hidden = holder.querySelector('input[type=hidden]'),
+            name = holder.getAttribute('data-name'),
+            timer = null;
+
+        if (multiple) {
+            selected.addEventListener('click', function (event) {
+                if (event.target.tagName === 'LI') {
+                    selected.removeChild(event.target);
+                }
+            });
+        }
+
+        function select(choice) {
+            var item, input;
+            if (multiple) {
+                item = document.createElement('li');
+                input = document.createElement('input');
+                input.type = 'hidden';
+                input.name = name;
+                input.value = choice.id;
+                item.appendChild(document.createTextNode(choice.label));
+                item.appendChild(input);
+                selected.appendChild(item);
+                search.value = '';
+            } else {
+                hidden.value = choice.id;
+                search.value = choice.label;
+            }
+            results.innerHTML = '';
+        }
+
+        search.addEventListener('input', function () {
+            if (!multiple && !search.value) {
+                hidden.value = '';
+            }
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                lookup(url, search.value, function (data) {
+                    results.innerHTML = '';
+                    data.results.forEach(function (choice) {
+                        var item = document.createElement('li');
+                        item.appendChild(document.createTextNode(choice.label));
+                        item.addEventListener('mousedown', function () {
+                            select(choice);
+                        });
+                        results.appendChild(item);
+                    });
+                });
+            }, 200);
+        });
+        search.addEventListener('blur', function () {
+            results.innerHTML = '';
+        });
+    }
+
+    Array.prototype.forEach.call(
+        document.querySelectorAll('.typeahead[data-lookup-url]'), bind);
+})();
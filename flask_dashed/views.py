@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import csv
+import json
+from cStringIO import StringIO
 from functools import wraps
+from hashlib import md5
 from math import ceil
+from time import time
 from flask import render_template, request, flash, redirect, url_for
-from flask import abort
+from flask import abort, Response, stream_with_context, jsonify, send_file
+from flask import make_response, session, Markup
 from flask.views import MethodView
+from flask.ext.wtf import Form
+from flask_dashed.profiling import phase
 
 
 def get_next_or(url):
@@ -20,7 +28,11 @@ def secure(endpoint, function, http_code):
     def decorator(view_func):
         @wraps(view_func)
         def _wrapped_view(self, *args, **kwargs):
-            if not function(self, *args, **kwargs):
+            permissions = self.admin_module.admin.permissions
+            with phase('security'):
+                allowed = permissions.evaluate(function, self, *args,
+                    **kwargs)
+            if not allowed:
                 return abort(http_code)
             return view_func(self, *args, **kwargs)
         return _wrapped_view
@@ -32,6 +44,9 @@ class AdminModuleMixin(object):
 
     :param admin_module: The admin module
     """
+    # GET requests don't write, see `flask_dashed.ext.sqlalchemy.UnitOfWork`
+    read_only = False
+
     def __init__(self, admin_module):
         self.admin_module = admin_module
 
@@ -41,9 +56,87 @@ class DashboardView(MethodView, AdminModuleMixin):
 
     :param admin_module: The admin module
     """
+    read_only = True
+
     def get(self):
-        return  render_template('flask_dashed/dashboard.html',
-            admin=self.admin_module.admin, module=self.admin_module)
+        with phase('render'):
+            return  render_template('flask_dashed/dashboard.html',
+                admin=self.admin_module.admin, module=self.admin_module)
+
+
+class DashboardWidgetView(MethodView, AdminModuleMixin):
+    """Returns a single dashboard widget content as an html fragment,
+    conditional requests are answered from its ETag.
+
+    :param admin_module: The dashboard
+    """
+    read_only = True
+
+    def get(self, index):
+        try:
+            widget = self.admin_module.widgets[index]
+        except IndexError:
+            abort(404)
+        rendered_at, content = self.admin_module.get_widget_entry(widget)
+        response = Response(content, mimetype='text/html')
+        response.add_etag()
+        response.cache_control.private = True
+        if widget.cache_timeout is None:
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.max_age = max(int(widget.cache_timeout
+                - (time() - rendered_at)), 0)
+        return response.make_conditional(request)
+
+
+def get_validators(admin_module, *extra):
+    """Returns current request `(etag, last_modified)` from admin module
+    data version, both None when data isn't versioned. The ETag also
+    depends on request url and user identity, the last modification date
+    is informative only as it may not change on deletions.
+
+    :param admin_module: The admin module
+    :param extra: Additional values the page depends on
+    """
+    version = admin_module.get_data_version()
+    if version is None:
+        return None, None
+    identity = admin_module.admin.permissions.identity
+    etag = md5(repr((version, request.url,
+        identity() if identity is not None else None) + extra)).hexdigest()
+    return etag, admin_module.get_last_modified()
+
+
+def get_not_modified(etag, last_modified):
+    """Returns a 304 Not Modified response when request ETag matches, None
+    otherwise. Pages having pending flash messages are always sent.
+
+    :param etag: The page ETag
+    :param last_modified: The page data last modification datetime
+    """
+    if etag is None or session.get('_flashes'):
+        return None
+    if etag not in request.if_none_match:
+        return None
+    response = Response(status=304)
+    return set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    """Adds validators to response, which browsers must revalidate.
+
+    :param response: The response or its content
+    :param etag: The page ETag
+    :param last_modified: The page data last modification datetime
+    """
+    response = make_response(response)
+    if etag is not None:
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
 
 
 def compute_args(request, update={}):
@@ -59,36 +152,170 @@ def compute_args(request, update={}):
 
 
 class ObjectListView(MethodView, AdminModuleMixin):
-    """Lists objects.
+    """Lists objects, conditional requests are answered from admin module
+    data version without querying objects and rendered contents may be
+    cached in admin module `list_cache`.
 
     :param admin_module: the admin module
     """
+    read_only = True
+
     def get(self, page=1):
         """Displays object list.
 
         :param page: The current page index
         """
         page = int(page)
+        # Cached bulk forms are renewed before their CSRF token expires
+        etag, last_modified = get_validators(self.admin_module,
+            int(time() // self.admin_module.form_etag_timeout)
+            if self.admin_module.bulk_actions else None)
+        response = get_not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        cache = self.admin_module.list_cache
+        cache_key = self.admin_module.get_list_cache_key()
+        content = None
+        if cache_key is not None:
+            with phase('cache'):
+                content = cache.get(cache_key)
+        if content is None:
+            content = self.render_content(page)
+            if cache_key is not None:
+                cache.set(cache_key, content,
+                    self.admin_module.list_cache_timeout)
+        if self.admin_module.bulk_actions:
+            content = content.replace(CSRF_PLACEHOLDER,
+                BulkForm().hidden_tag())
+        with phase('render'):
+            return set_validators(render_template(
+                self.admin_module.list_template,
+                admin=self.admin_module.admin,
+                module=self.admin_module,
+                content=Markup(content)
+            ), etag, last_modified)
+
+    def render_content(self, page):
+        """Renders objects table, pagination and counter.
+
+        :param page: The current page index
+        """
         search = request.args.get('search', None)
         order_by = request.args.get('orderby', None)
         order_direction = request.args.get('orderdir', None)
-        count = self.admin_module.count_list(search=search)
-        return  render_template(
-            self.admin_module.list_template,
-            admin=self.admin_module.admin,
-            module=self.admin_module,
-            objects=self.admin_module.get_object_list(
-                search=search,
-                offset=self.admin_module.list_per_page * (page - 1),
-                limit=self.admin_module.list_per_page,
-                order_by_name=order_by,
-                order_by_direction=order_direction,
-            ),
-            count=count,
-            current_page=page,
-            pages=self.iter_pages(count, page),
-            compute_args=compute_args
+        with phase('count'):
+            count = self.admin_module.get_list_count(search=search)
+        pages, links = None, None
+        with phase('list'):
+            if self.admin_module.list_pagination == 'keyset':
+                objects, links = self.get_keyset_page(search, order_by,
+                    order_direction)
+            elif count is None:
+                objects, links = self.get_uncounted_page(page, search,
+                    order_by, order_direction)
+            else:
+                objects = self.admin_module.get_object_list(
+                    search=search,
+                    offset=self.admin_module.list_per_page * (page - 1),
+                    limit=self.admin_module.list_per_page,
+                    order_by_name=order_by,
+                    order_by_direction=order_direction,
+                )
+                pages = self.iter_pages(count, page)
+        with phase('render'):
+            return render_template(
+                self.admin_module.list_content_template,
+                admin=self.admin_module.admin,
+                module=self.admin_module,
+                objects=objects,
+                rows=self.admin_module.get_list_rows(objects),
+                count=count,
+                count_is_exact=self.admin_module.list_count.exact,
+                current_page=page,
+                pages=pages,
+                links=links,
+                compute_args=compute_args,
+                csrf_token=CSRF_PLACEHOLDER
+            )
+
+    def get_uncounted_page(self, page, search=None, order_by=None,
+            order_direction=None):
+        """Returns page objects and previous/next links when total is
+        unknown.
+
+        One extra object is fetched to know whether a following page exists.
+
+        :param page: The current page index
+        :param search: The search string
+        :param order_by: The ordering field
+        :param order_direction: The ordering direction
+        """
+        per_page = self.admin_module.list_per_page
+        objects = self.admin_module.get_object_list(
+            search=search,
+            offset=per_page * (page - 1),
+            limit=per_page + 1,
+            order_by_name=order_by,
+            order_by_direction=order_direction,
+        )
+        links = self.iter_links('listpaged',
+            {'page': page - 1} if page > 1 else None,
+            {'page': page + 1} if len(objects) > per_page else None)
+        return objects[:per_page], list(links)
+
+    def get_keyset_page(self, search=None, order_by=None,
+            order_direction=None):
+        """Returns objects located around `after` or `before` request args
+        cursors and previous/next links.
+
+        One extra object is fetched to know whether a following page exists.
+
+        :param search: The search string
+        :param order_by: The ordering field
+        :param order_direction: The ordering direction
+        """
+        per_page = self.admin_module.list_per_page
+        after = request.args.get('after', None)
+        before = request.args.get('before', None)
+        objects = self.admin_module.get_object_list(
+            search=search,
+            limit=per_page + 1,
+            order_by_name=order_by,
+            order_by_direction=order_direction,
+            after=after,
+            before=before,
         )
+        has_more = len(objects) > per_page
+        if before is not None:
+            objects = objects[-per_page:]
+            has_previous, has_next = has_more, True
+        else:
+            objects = objects[:per_page]
+            has_previous, has_next = after is not None, has_more
+        previous_args, next_args = None, None
+        if has_previous and objects:
+            previous_args = {'before': self.admin_module.get_object_pk(
+                objects[0]), 'after': None, 'page': None}
+        if has_next and objects:
+            next_args = {'after': self.admin_module.get_object_pk(
+                objects[-1]), 'before': None, 'page': None}
+        return objects, list(self.iter_links('list', previous_args,
+            next_args))
+
+    def iter_links(self, endpoint, previous_args, next_args):
+        """Yields previous and next pager links as `(label, url)`, `url`
+        being None when link is disabled.
+
+        :param endpoint: The module relative endpoint
+        :param previous_args: The previous page args or None
+        :param next_args: The next page args or None
+        """
+        for label, args in (('previous', previous_args), ('next', next_args)):
+            if args is None:
+                yield label, None
+            else:
+                yield label, url_for(".%s_%s" % (self.admin_module.endpoint,
+                    endpoint), **compute_args(request, args))
 
     def iter_pages(self, count, current_page, left_edge=2,
                    left_current=2, right_current=5, right_edge=2):
@@ -106,6 +333,143 @@ class ObjectListView(MethodView, AdminModuleMixin):
                 last = num
 
 
+def iter_csv(columns, rows, buffer_size=8192):
+    """Yields CSV encoded header then rows by chunks.
+
+    :param columns: The column titles
+    :param rows: The row values iterable
+    :param buffer_size: The chunk size
+    """
+    def encode(value):
+        if value is None:
+            return ''
+        if not isinstance(value, basestring):
+            value = unicode(value)
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return value
+
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([encode(column) for column in columns])
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow([encode(value) for value in row])
+        if buffer.tell() >= buffer_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_json_lines(keys, rows, buffer_size=8192):
+    """Yields rows as JSON objects, one per line, by chunks.
+
+    :param keys: The object keys
+    :param rows: The row values iterable
+    :param buffer_size: The chunk size
+    """
+    def encode(value):
+        if value is None or isinstance(value, (bool, int, long, float,
+                basestring)):
+            return value
+        return unicode(value)
+
+    chunk = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(keys, [encode(value) for value in row])))
+        chunk.append(line)
+        size += len(line) + 1
+        if size >= buffer_size:
+            yield '\n'.join(chunk) + '\n'
+            chunk, size = [], 0
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+# Export mimetypes and file extensions by format
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+def iter_export(admin_module, format, search=None, order_by_name=None,
+        order_by_direction=None, objects=None):
+    """Yields exported object list chunks.
+
+    :param admin_module: The object admin module
+    :param format: The export format
+    :param search: The search string
+    :param order_by_name: The ordering field
+    :param order_by_direction: The ordering direction
+    :param objects: The objects iterable, queried from arguments if None
+    """
+    fields = [field for field, accessor in admin_module.list_accessors]
+    if objects is None:
+        objects = admin_module.iter_export_objects(search=search,
+            order_by_name=order_by_name,
+            order_by_direction=order_by_direction)
+    rows = admin_module.iter_export_rows(objects)
+    if format == 'csv':
+        return iter_csv([admin_module.list_fields[field].get('label', field)
+            for field in fields], rows)
+    return iter_json_lines(fields, rows)
+
+
+def get_job_runner(admin_module, action):
+    """Returns admin job runner when module runs action in background.
+
+    :param admin_module: The admin module
+    :param action: The action name
+    """
+    if action in admin_module.background_actions:
+        return admin_module.admin.job_runner
+
+
+class ObjectExportView(MethodView, AdminModuleMixin):
+    """Streams filtered and ordered objects as CSV or JSON Lines.
+
+    :param admin_module: the admin module
+    """
+    read_only = True
+
+    def get(self):
+        """Streams objects according to `format` request arg, for users
+        allowed to list them.
+        """
+        self.admin_module.check_endpoint_security('list', self)
+        format = request.args.get('format', 'csv')
+        if format not in EXPORT_FORMATS:
+            abort(400)
+        search = request.args.get('search', None)
+        order_by = request.args.get('orderby', None)
+        order_direction = request.args.get('orderdir', None)
+        runner = get_job_runner(self.admin_module, 'export')
+        if runner is not None:
+            runner.submit('export', self.admin_module.endpoint,
+                format, search, order_by, order_direction,
+                module=self.admin_module.endpoint)
+            flash("Export started", "success")
+            return redirect(runner.get_url())
+        mimetype, extension = EXPORT_FORMATS[format]
+        content = iter_export(self.admin_module, format, search, order_by,
+            order_direction)
+        return Response(stream_with_context(content), mimetype=mimetype,
+            headers={'Content-Disposition': 'attachment; filename=%s.%s' %
+                (self.admin_module.endpoint, extension)})
+
+
+class ConflictError(Exception):
+    """Raised when saving an object modified since its form was rendered.
+    """
+    pass
+
+
 class ObjectFormView(MethodView, AdminModuleMixin):
     """Creates or updates object.
 
@@ -116,34 +480,58 @@ class ObjectFormView(MethodView, AdminModuleMixin):
 
         :param pk: The object primary key
         """
-        obj = self.object
+        # Cached forms are renewed before their CSRF token expires
+        etag, last_modified = get_validators(self.admin_module,
+            int(time() // self.admin_module.form_etag_timeout))
+        response = get_not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        with phase('object'):
+            obj = self.object
         if pk and obj is None:
             abort(404)
         is_new = pk is None
-        form = self.admin_module.get_form(obj)
-        return  render_template(
-            self.admin_module.edit_template,
-            admin=self.admin_module.admin,
-            module=self.admin_module,
-            object=obj,
-            form=form,
-            is_new=is_new
-        )
+        with phase('form'):
+            form = self.admin_module.get_form(obj)
+        with phase('render'):
+            return set_validators(render_template(
+                self.admin_module.edit_template,
+                admin=self.admin_module.admin,
+                module=self.admin_module,
+                object=obj,
+                form=form,
+                is_new=is_new,
+                version=self.admin_module.get_object_version(obj)
+            ), etag, last_modified)
 
     def post(self, pk=None):
         """Process form.
 
         :param pk: The object primary key
         """
-        obj = self.object
+        with phase('object'):
+            obj = self.object
         if pk and obj is None:
             abort(404)
         is_new = pk is None
-        form = self.admin_module.get_form(obj)
-        form.process(request.form)
-        if form.validate():
-            form.populate_obj(obj)
-            self.admin_module.save_object(obj)
+        version = request.form.get('_version', None) or None
+        with phase('form'):
+            form = self.admin_module.get_form(obj, formdata=request.form)
+            is_valid = form.validate()
+        if is_valid:
+            if version is None and not is_new and\
+                    self.admin_module.get_object_version(obj) is not None:
+                # Versioned objects are only saved along with their version
+                return self.conflict(pk, form, is_new)
+            try:
+                with phase('save'):
+                    form.populate_obj(obj)
+                    if version is None:
+                        self.admin_module.save_object(obj)
+                    else:
+                        self.admin_module.save_object(obj, version=version)
+            except ConflictError:
+                return self.conflict(pk, form, is_new)
             if is_new:
                 flash("Object successfully created", "success")
             else:
@@ -152,14 +540,46 @@ class ObjectFormView(MethodView, AdminModuleMixin):
                 (self.admin_module.endpoint, 'list'))))
         else:
             flash("Can't save object due to errors", "error")
-        return  render_template(
-            self.admin_module.edit_template,
-            admin=self.admin_module.admin,
-            module=self.admin_module,
-            object=obj,
-            form=form,
-            is_new=is_new
-        )
+        with phase('render'):
+            return  render_template(
+                self.admin_module.edit_template,
+                admin=self.admin_module.admin,
+                module=self.admin_module,
+                object=obj,
+                form=form,
+                is_new=is_new,
+                version=version
+            )
+
+    def conflict(self, pk, form, is_new):
+        """Renders submitted form along with its differences to currently
+        stored object, saving it again overwrites stored object.
+
+        :param pk: The object primary key
+        :param form: The submitted form
+        :param is_new: Whether object is new
+        """
+        obj = self.admin_module.get_object(pk)
+        if obj is None:
+            abort(404)
+        stored = self.admin_module.get_form(obj)
+        diff = [(field.label.text, field.data, stored[field.name].data)
+            for field in form if field.name in stored and
+            field.type not in ('CSRFTokenField', 'HiddenField') and
+            field.data != stored[field.name].data]
+        flash("Object was modified meanwhile, review changes then save again",
+            "error")
+        with phase('render'):
+            return render_template(
+                self.admin_module.edit_template,
+                admin=self.admin_module.admin,
+                module=self.admin_module,
+                object=obj,
+                form=form,
+                is_new=is_new,
+                version=self.admin_module.get_object_version(obj),
+                diff=diff
+            ), 409
 
     @property
     def object(self):
@@ -176,6 +596,85 @@ class ObjectFormView(MethodView, AdminModuleMixin):
         return self._object
 
 
+class ObjectLookupView(MethodView, AdminModuleMixin):
+    """Returns a page of objects related through a relationship field as
+    JSON, searched by `q` request arg.
+
+    :param admin_module: The admin module
+    """
+    read_only = True
+
+    def get(self, field):
+        if field not in (self.admin_module.lookup_fields or {}):
+            abort(404)
+        # Lookups serve forms, either one must be allowed
+        if not self.admin_module.is_endpoint_allowed('new', self):
+            self.admin_module.check_endpoint_security('edit', self)
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+        except ValueError:
+            abort(400)
+        choices, more = self.admin_module.lookup(field,
+            search=request.args.get('q', None), page=page)
+        return jsonify(results=[{'id': pk, 'label': label}
+            for pk, label in choices], more=more)
+
+
+class BulkForm(Form):
+    """Bulk actions form, only carrying its CSRF token.
+    """
+    pass
+
+
+# Replaced by bulk form CSRF token once list contents are rendered, as they
+# may be cached
+CSRF_PLACEHOLDER = Markup('<!-- flask_dashed:csrf -->')
+
+
+class ObjectBulkView(MethodView, AdminModuleMixin):
+    """Applies bulk action to selected objects. Actions are secured as the
+    endpoint they stand in for: `delete` for deleting actions, `edit` unless
+    the action has an `endpoint` otherwise. Security functions are evaluated
+    with this view, whose `object` is None, and no other argument.
+
+    :param admin_module: the admin module
+    """
+    object = None
+
+    def post(self):
+        """Applies `action` to objects matching `pk` form values, or to all
+        objects matching `search` when `all` is checked.
+        """
+        name = request.form.get('action', None)
+        if name not in (self.admin_module.bulk_actions or {}):
+            abort(400)
+        if not BulkForm().validate():
+            abort(400)
+        action = self.admin_module.bulk_actions[name]
+        self.admin_module.check_endpoint_security(action.get('endpoint',
+            'delete' if action.get('delete', False) else 'edit'), self)
+        redirect_url = get_next_or(url_for(".%s_%s" %
+            (self.admin_module.endpoint, 'list')))
+        if request.form.get('all', None):
+            pks, search = None, request.form.get('search', None) or None
+        else:
+            pks, search = request.form.getlist('pk'), None
+            if not pks:
+                flash("No object selected", "error")
+                return redirect(redirect_url)
+        runner = get_job_runner(self.admin_module, 'bulk')
+        if runner is not None:
+            runner.submit('bulk_action', self.admin_module.endpoint,
+                name, pks, search, module=self.admin_module.endpoint)
+            flash("Action started", "success")
+            return redirect(runner.get_url())
+        count = self.admin_module.execute_bulk_action(name, pks=pks,
+            search=search)
+        flash("Action successfully applied to %d object(s)" % count,
+            "success")
+        return redirect(redirect_url)
+
+
 class ObjectDeleteView(MethodView, AdminModuleMixin):
     """Deletes object.
 
@@ -186,8 +685,59 @@ class ObjectDeleteView(MethodView, AdminModuleMixin):
 
         :param pk: The primary key
         """
-        obj = self.admin_module.get_object(pk)
-        self.admin_module.delete_object(obj)
+        with phase('object'):
+            obj = self.admin_module.get_object(pk)
+        with phase('delete'):
+            self.admin_module.delete_object(obj)
         flash("Object successfully deleted", "success")
         return redirect(get_next_or(url_for(".%s_%s" %
             (self.admin_module.endpoint, 'list'))))
+
+
+class JobListView(MethodView, AdminModuleMixin):
+    """Lists latest jobs.
+
+    :param admin_module: The jobs admin module
+    """
+    read_only = True
+
+    def get(self):
+        return  render_template('flask_dashed/jobs.html',
+            admin=self.admin_module.admin, module=self.admin_module,
+            runner=self.admin_module.runner,
+            jobs=self.admin_module.get_jobs(self))
+
+
+class JobStatusView(MethodView, AdminModuleMixin):
+    """Returns job status as JSON.
+
+    :param admin_module: The jobs admin module
+    """
+    read_only = True
+
+    def get(self, job_id):
+        job = self.admin_module.runner.store.get(job_id)
+        if job is None or not self.admin_module.is_job_allowed(job, self):
+            abort(404)
+        status = dict((key, job[key]) for key in ('id', 'task', 'status',
+            'progress', 'message', 'error', 'created', 'updated'))
+        if job['result_path']:
+            status['result_url'] = url_for(".%s_%s" %
+                (self.admin_module.endpoint, 'result'), job_id=job_id)
+        return jsonify(status)
+
+
+class JobResultView(MethodView, AdminModuleMixin):
+    """Sends job result file.
+
+    :param admin_module: The jobs admin module
+    """
+    read_only = True
+
+    def get(self, job_id):
+        job = self.admin_module.runner.store.get(job_id)
+        if job is None or job['status'] != 'done' or not job['result_path']\
+                or not self.admin_module.is_job_allowed(job, self):
+            abort(404)
+        return send_file(job['result_path'], mimetype=job['result_mimetype'],
+            as_attachment=True, attachment_filename=job['result_filename'])
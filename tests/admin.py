@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 import unittest
-from flask import Flask
+from time import sleep, time
+from flask import Flask, g, request
 from flask.ext.testing import TestCase
-from flask_dashed.admin import Admin, AdminModule
+from flask_dashed.admin import Admin, AdminModule, get_accessor
+from flask_dashed.admin import recursive_getattr, PermissionEvaluator
+from flask_dashed.cache import LRUCache
+from flask_dashed.dashboard import Dashboard, DashboardWidget
+from flask_dashed.profiling import Profiler
 
 
 class DashedTestCase(TestCase):
@@ -48,8 +53,9 @@ class AdminTest(DashedTestCase):
         self.assertEqual(child.url_path, '/parent/child')
         self.assertEqual(
             child.parents,
-            [parent]
+            (parent,)
         )
+        self.assertEqual(child.depth, 1)
 
     def test_children_two_levels(self):
         parent = self.admin.register_node('/root', 'first_root_node',
@@ -71,6 +77,322 @@ class AdminTest(DashedTestCase):
             second_child.parent, child
         )
 
+    def test_path_security(self):
+        node = self.admin.register_node('/node', 'node', 'node')
+        self.admin.register_node('/child', 'child', 'child', parent=node)
+        self.admin.register_node('/nodes', 'nodes', 'nodes')
+
+        @node.secure(403)
+        def secure():
+            return False
+
+        self.assertEqual(self.admin.get_path_security('/node/child/x'),
+            [(secure, 403)])
+        self.assertEqual(self.admin.get_path_security('/nodes'), [])
+        self.assertEqual(self.admin.get_path_security('/'), [])
+
+    def test_path_security_cache(self):
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
+
+        @self.admin.main_dashboard.secure(401)
+        def secure():
+            return False
+
+        self.assertEqual(self.client.get('/admin/').status_code, 401)
+
+    def test_node_indexes(self):
+        parent = self.admin.register_node('/parent', 'parent', 'parent')
+        child = self.admin.register_node('/child', 'child', 'child',
+            parent=parent)
+        self.assertIs(self.admin.get_node('child'), child)
+        self.assertIs(self.admin.get_node_by_path('/parent/child'), child)
+        with self.app.test_request_context(self.admin.url_prefix + '/'):
+            self.app.preprocess_request()
+            self.assertIs(self.admin.get_request_node(),
+                self.admin.main_dashboard)
+
+
+class NavigationTest(DashedTestCase):
+
+    def test_navigation_model(self):
+        parent = self.admin.register_node('/parent', 'parent', 'parent')
+        child = self.admin.register_node('/child', 'child', 'child',
+            parent=parent)
+        with self.app.test_request_context():
+            item = self.admin.get_navigation_item(child)
+            self.assertEqual(item.url_path, '/parent/child')
+            self.assertEqual([p.node for p in item.parents], [parent])
+            self.assertEqual(self.admin.navigation[1].children, (item,))
+            self.assertEqual(self.admin.navigation[0].url,
+                self.admin.main_dashboard.url)
+
+    def test_hidden_nodes(self):
+        self.admin.register_node('/visible', 'visible', 'visible node')
+        hidden = self.admin.register_node('/hidden', 'hidden', 'hidden node')
+
+        @hidden.secure(403)
+        def secure():
+            return False
+
+        r = self.client.get(self.admin.main_dashboard.url)
+        self.assertIn('visible node', r.data)
+        self.assertNotIn('hidden node', r.data)
+
+    def test_warm_up_before_request(self):
+        self._ctx.pop()
+        try:
+            self.admin.warm_up()
+        finally:
+            self._ctx.push()
+        r = self.client.get(self.admin.main_dashboard.url)
+        self.assertIn('href="/admin/" class="" title="dashboard"', r.data)
+        r = self.client.get('/admin/', environ_overrides={
+            'SCRIPT_NAME': '/mounted'})
+        self.assertIn('href="/mounted/admin/" class="" title="dashboard"',
+            r.data)
+
+    def test_rendered_once(self):
+        self.client.get(self.admin.main_dashboard.url)
+        self.assertEqual(len(self.admin.navigation_cache._items), 1)
+        self.client.get(self.admin.main_dashboard.url)
+        self.assertEqual(len(self.admin.navigation_cache._items), 1)
+        self.admin.register_node('/node', 'node', 'new node')
+        self.assertEqual(len(self.admin.navigation_cache._items), 0)
+        r = self.client.get(self.admin.main_dashboard.url)
+        self.assertIn('new node', r.data)
+
+
+class PermissionTest(DashedTestCase):
+
+    def create_app(self):
+        self.calls = []
+        self.user = 'john'
+        app = Flask(__name__)
+        self.admin = Admin(app, permissions=PermissionEvaluator(LRUCache(),
+            lambda: self.user))
+        return app
+
+    def check(self):
+        self.calls.append(self.user)
+        return True
+
+    def test_evaluated_once_per_request(self):
+        with self.app.test_request_context():
+            permissions = self.admin.permissions
+            self.assertTrue(permissions.evaluate(self.check))
+            self.assertTrue(permissions.evaluate(self.check))
+            self.assertEqual(permissions.stats['evaluated'], 1)
+            self.assertEqual(permissions.stats['memoized'], 1)
+
+    def test_stored_by_identity(self):
+        for user in ('john', 'john', 'jane'):
+            self.user = user
+            with self.app.test_request_context():
+                self.admin.permissions.evaluate(self.check)
+        self.assertEqual(self.calls, ['john', 'jane'])
+
+    def test_is_path_allowed(self):
+        node = self.admin.register_node('/node', 'node', 'node')
+        node.secure(403)(self.check)
+        with self.app.test_request_context():
+            self.assertTrue(self.admin.is_path_allowed('/node'))
+            self.assertTrue(self.admin.is_path_allowed('/node/child'))
+            self.assertEqual(self.admin.permissions.stats['memoized'], 1)
+
+
+class SlowWidget(DashboardWidget):
+
+    def __init__(self, title, delay=0, **kwargs):
+        DashboardWidget.__init__(self, title, **kwargs)
+        self.delay = delay
+        self.renders = 0
+
+    def render(self):
+        sleep(self.delay)
+        self.renders += 1
+        return '<p>%s %d</p>' % (self.title, self.renders)
+
+
+class WidgetTest(DashedTestCase):
+
+    def register_dashboard(self, *widgets):
+        class WidgetDashboard(Dashboard):
+            widget_cache = LRUCache()
+            widget_pool_size = 4
+        WidgetDashboard.widgets = list(widgets)
+        return self.admin.register_module(WidgetDashboard, '/widgets',
+            'widgets', 'widgets')
+
+    def test_cached_render(self):
+        widget = SlowWidget('cached', cache_timeout=60)
+        dashboard = self.register_dashboard(widget)
+        for i in range(2):
+            r = self.client.get(dashboard.url)
+            self.assertIn('cached 1', r.data)
+        self.assertEqual(widget.renders, 1)
+
+    def test_stale_render_is_refreshed(self):
+        widget = SlowWidget('stale', cache_timeout=60, stale_timeout=60)
+        dashboard = self.register_dashboard(widget)
+        dashboard.widget_cache.set(widget.get_cache_key(dashboard),
+            (time() - 90, '<p>old</p>'))
+        r = self.client.get(dashboard.url)
+        self.assertIn('old', r.data)
+        for i in range(50):
+            if widget.renders:
+                break
+            sleep(0.01)
+        r = self.client.get(dashboard.url)
+        self.assertIn('stale 1', r.data)
+
+    def test_parallel_render(self):
+        dashboard = self.register_dashboard(SlowWidget('first', 0.2),
+            SlowWidget('second', 0.2), SlowWidget('third', 0.2))
+        start = time()
+        r = self.client.get(dashboard.url)
+        self.assertLess(time() - start, 0.5)
+        for title in ('first', 'second', 'third'):
+            self.assertIn('%s 1' % title, r.data)
+
+    def test_pooled_request_globals(self):
+
+        @self.app.before_request
+        def load_user():
+            g.user = request.args.get('user')
+
+        class UserWidget(DashboardWidget):
+            def render(self):
+                return '<p>user %s</p>' % g.user
+
+        dashboard = self.register_dashboard(UserWidget('first'),
+            UserWidget('second'))
+        r = self.client.get(dashboard.url + '?user=alice')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data.count('user alice'), 2)
+
+    def test_timeout_fallback(self):
+        widget = SlowWidget('slow', 0.3, render_timeout=0.05)
+        dashboard = self.register_dashboard(widget)
+        r = self.client.get(dashboard.url)
+        self.assertIn('loading', r.data)
+        sleep(0.4)
+        r = self.client.get(dashboard.url)
+        self.assertIn('slow 1', r.data)
+
+
+class LazyWidgetTest(DashedTestCase):
+
+    def create_app(self):
+        app = super(LazyWidgetTest, self).create_app()
+        self.widget = SlowWidget('lazy', cache_timeout=60)
+
+        class LazyDashboard(Dashboard):
+            lazy_widgets = True
+            widget_cache = LRUCache()
+            widgets = [self.widget]
+        self.dashboard = self.admin.register_module(LazyDashboard, '/lazy',
+            'lazy', 'lazy dashboard')
+        return app
+
+    def test_skeleton(self):
+        r = self.client.get(self.dashboard.url)
+        self.assertIn('data-url="/admin/lazy/widgets/0"', r.data)
+        self.assertEqual(self.widget.renders, 0)
+
+    def test_fragment(self):
+        r = self.client.get('/admin/lazy/widgets/0')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data, '<p>lazy 1</p>')
+        self.assertIn('max-age=', r.headers['Cache-Control'])
+        etag = r.headers['ETag']
+        r = self.client.get('/admin/lazy/widgets/0',
+            headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(self.widget.renders, 1)
+
+    def test_unknown_fragment(self):
+        r = self.client.get('/admin/lazy/widgets/1')
+        self.assertEqual(r.status_code, 404)
+
+
+class ProfilerTest(DashedTestCase):
+
+    def create_app(self):
+        app = super(ProfilerTest, self).create_app()
+        app.add_url_rule('/public', 'public', lambda: '<body></body>')
+        Profiler(self.admin, enabled=lambda: 'noprofile' not in request.args)
+        return app
+
+    def test_server_timing(self):
+        r = self.client.get('/admin/')
+        timing = r.headers['Server-Timing']
+        for metric in ('security;dur=', 'render;dur=', 'sql;desc="0 queries"',
+                'total;dur='):
+            self.assertIn(metric, timing)
+
+    def test_panel(self):
+        r = self.client.get('/admin/')
+        self.assertIn('<aside id="profiler">', r.data)
+        self.assertLess(r.data.index('id="profiler"'),
+            r.data.index('</body>'))
+
+    def test_not_profiled(self):
+        r = self.client.get('/public')
+        self.assertNotIn('Server-Timing', r.headers)
+        r = self.client.get('/admin/?noprofile')
+        self.assertNotIn('Server-Timing', r.headers)
+        self.assertNotIn('profiler', r.data)
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_threshold(self):
+        cache = LRUCache(threshold=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_timeout(self):
+        cache = LRUCache()
+        cache.set('a', 1, timeout=-1)
+        self.assertEqual(cache.get('a'), None)
+
+    def test_inc(self):
+        cache = LRUCache()
+        self.assertEqual(cache.inc('a'), 1)
+        self.assertEqual(cache.inc('a'), 2)
+
+
+class AccessorTest(unittest.TestCase):
+
+    class Object(object):
+        pass
+
+    def setUp(self):
+        self.obj = self.Object()
+        self.obj.b = self.Object()
+        self.obj.b.c = 1
+        self.obj.d = None
+
+    def test_accessor(self):
+        self.assertEqual(get_accessor('b.c')(self.obj), 1)
+        self.assertEqual(get_accessor('b')(self.obj), self.obj.b)
+
+    def test_missing_attribute(self):
+        self.assertEqual(get_accessor('b.d')(self.obj), None)
+        self.assertEqual(get_accessor('d.c')(self.obj), None)
+
+    def test_accessor_is_compiled_once(self):
+        self.assertIs(get_accessor('b.c'), get_accessor('b.c'))
+
+    def test_recursive_getattr(self):
+        self.assertEqual(recursive_getattr(self.obj, 'b.c'), 1)
+        self.assertEqual(recursive_getattr(self.obj, 'e'), None)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,13 +1,30 @@
 # -*- coding: utf-8 -*-
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
 import unittest
+import sqlalchemy
 import wtforms
 from werkzeug import OrderedMultiDict
+import flask
 from flask import Flask, url_for
 from flask.ext.testing import TestCase
 from flask.ext.sqlalchemy import SQLAlchemy
 from flask_dashed.admin import Admin, ObjectAdminModule
-from flask_dashed.ext.sqlalchemy import ModelAdminModule
+from flask_dashed.cache import LRUCache
+from flask_dashed.ext.sqlalchemy import ModelAdminModule, model_form
+from flask_dashed.ext.sqlalchemy import TableVersions, UnitOfWork
+from flask_dashed.count import CachedCount, EstimatedCount, NoCount
+from flask_dashed.ext.search import PrefixSearch, TokenizedSearch
+from flask_dashed.ext.search import PostgresFullTextSearch
+from flask_dashed.ext.search import SQLiteFullTextSearch
+from flask_dashed.jobs import JobRunner, SQLiteJobStore
+from flask_dashed.profiling import Profiler, Profile, get_profile
 from wtforms.ext.sqlalchemy.fields import QuerySelectField
+from sqlalchemy import orm
 from sqlalchemy.orm import aliased, contains_eager
 
 
@@ -35,6 +52,12 @@ class Book(db.Model):
         backref="books")
 
 
+class Note(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    text = db.Column(db.String(255))
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
 class BaseTest(TestCase):
     def setUp(self):
         db.create_all()
@@ -134,6 +157,12 @@ class AutoModelAdminModuleTest(BaseTest):
         r = self.client.get(url_for('admin.book_list'))
         self.assertEqual(r.status_code, 200)
 
+    def test_list_view_pager(self):
+        r = self.client.get(url_for('admin.book_list'))
+        self.assertIn(url_for('admin.book_listpaged', page=2), r.data)
+        r = self.client.get(url_for('admin.book_listpaged', page=2))
+        self.assertEqual(r.status_code, 200)
+
     def test_edit_view(self):
         r = self.client.get(url_for('admin.book_edit',
             pk=Book.query.first().id))
@@ -225,6 +254,1108 @@ class ExplicitModelAdminModuleTest(BaseTest):
         objects = self.book_module.get_object_list(search='lettres')
         self.assertEqual(len(objects), 2)
 
+    def test_list_rows(self):
+        objects = self.book_module.get_object_list(search='lettres')
+        rows = self.book_module.get_list_rows(objects)
+        self.assertEqual(len(rows), 2)
+        obj, cells = rows[0]
+        self.assertEqual([cell[0] for cell in cells],
+            ['id', 'title', 'year', 'author.name'])
+        self.assertEqual(cells[3][1], obj.author.name)
+
+
+class ExportTest(BaseTest):
+
+    def create_app(self):
+        self.book_module = admin.register_module(
+            ExplicitModelAdminModuleTest.BookModule, '/export-book',
+            'export_book', 'exported book module')
+        return app
+
+    def test_export_csv(self):
+        r = self.client.get(url_for('admin.export_book_export', search='lettres',
+            orderby='id', orderdir='desc'))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'text/csv')
+        lines = r.data.splitlines()
+        self.assertEqual(lines[0], 'id,book title,year,author name')
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Lettres au petit B.,1930,Alain Fournier', lines[1])
+
+    def test_export_json_lines(self):
+        r = self.client.get(url_for('admin.export_book_export', format='jsonl'))
+        self.assertEqual(r.status_code, 200)
+        lines = [json.loads(line) for line in r.data.splitlines()]
+        self.assertEqual(len(lines), Book.query.count())
+        self.assertEqual(lines[0]['author.name'], u'Alain Fournier')
+        self.assertEqual(lines[0]['year'], 1913)
+
+    def test_export_unknown_format(self):
+        r = self.client.get(url_for('admin.export_book_export', format='xls'))
+        self.assertEqual(r.status_code, 400)
+
+    def test_list_security(self):
+
+        @self.book_module.secure_endpoint('list')
+        def secure(view):
+            return False
+
+        r = self.client.get(url_for('admin.export_book_export'))
+        self.assertEqual(r.status_code, 403)
+
+
+class BulkActionTest(BaseTest):
+
+    class BulkBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        searchable_fields = ['title']
+        bulk_actions = OrderedMultiDict((
+            ('delete', {'label': 'delete', 'delete': True}),
+            ('reset_year', {'label': 'reset year', 'values': {'year': 2000}}),
+        ))
+        bulk_chunk_size = 2
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.BulkBookModule,
+            '/bulk-book', 'bulk_book', 'bulk book module')
+        return app
+
+    def post(self, data):
+        app.config['CSRF_ENABLED'] = False
+        try:
+            return self.client.post(url_for('admin.bulk_book_bulk'),
+                data=data)
+        finally:
+            del app.config['CSRF_ENABLED']
+
+    def test_list_view_selection(self):
+        r = self.client.get(url_for('admin.bulk_book_list'))
+        self.assertIn('name="pk" value="%s"' % Book.query.first().id, r.data)
+        self.assertIn('value="reset_year"', r.data)
+        self.assertIn('name="csrf_token"', r.data)
+
+    def test_no_default_actions(self):
+        self.assertFalse(AutoModelAdminModuleTest.AutoBookModule
+            .bulk_actions)
+
+    def test_delete_selection(self):
+        total = Book.query.count()
+        pks = [str(book.id) for book in Book.query.limit(5)]
+        r = self.post({'action': 'delete', 'pk': pks})
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(Book.query.count(), total - 5)
+
+    def test_csrf_token(self):
+        total = Book.query.count()
+        r = self.client.post(url_for('admin.bulk_book_bulk'),
+            data={'action': 'delete', 'all': '1'})
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(Book.query.count(), total)
+        token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"',
+            self.client.get(url_for('admin.bulk_book_list')).data).group(1)
+        r = self.client.post(url_for('admin.bulk_book_bulk'),
+            data={'action': 'delete', 'all': '1', 'csrf_token': token})
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(Book.query.count(), 0)
+
+    def test_endpoint_security(self):
+        @self.book_module.secure_endpoint('delete', 403)
+        def secure(view, pk=None):
+            return False
+
+        total = Book.query.count()
+        book = Book.query.first()
+        r = self.client.get(url_for('admin.bulk_book_delete', pk=book.id))
+        self.assertEqual(r.status_code, 403)
+        r = self.post({'action': 'delete', 'all': '1'})
+        self.assertEqual(r.status_code, 403)
+        self.assertEqual(Book.query.count(), total)
+        r = self.post({'action': 'reset_year', 'all': '1'})
+        self.assertEqual(r.status_code, 302)
+
+    def test_update_all_matching(self):
+        count = self.book_module.execute_bulk_action('reset_year',
+            search=u'Le')
+        self.assertEqual(count, Book.query.filter(
+            Book.title.contains(u'Le')).count())
+        self.assertEqual(Book.query.filter_by(year=2000).count(), count)
+
+    def test_unknown_action(self):
+        r = self.post({'action': 'drop', 'all': '1'})
+        self.assertEqual(r.status_code, 400)
+
+
+class JobRunnerTest(BaseTest):
+
+    class JobBookModule(BulkActionTest.BulkBookModule):
+        background_actions = ('export', 'bulk')
+
+    def create_app(self):
+        self.tmp = tempfile.mkdtemp()
+        self.runner = JobRunner(admin, store=SQLiteJobStore(
+            os.path.join(self.tmp, 'jobs.db'), self.tmp), workers=0,
+            url_prefix='/bg-jobs', endpoint='bg_jobs')
+        self.book_module = admin.register_module(self.JobBookModule,
+            '/job-book', 'job_book', 'job book module')
+        return app
+
+    def tearDown(self):
+        super(JobRunnerTest, self).tearDown()
+        admin.job_runner = None
+        shutil.rmtree(self.tmp)
+
+    def test_background_export(self):
+        r = self.client.get(url_for('admin.job_book_export', format='csv'))
+        self.assertEqual(r.status_code, 302)
+        job = self.runner.store.list()[0]
+        self.assertEqual(job['status'], 'queued')
+        self.assertTrue(self.runner.run_next())
+        self.assertFalse(self.runner.run_next())
+        r = self.client.get(url_for('admin.bg_jobs_status', job_id=job['id']))
+        status = json.loads(r.data)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['progress'], 1.0)
+        r = self.client.get(status['result_url'])
+        self.assertEqual(r.mimetype, 'text/csv')
+        self.assertEqual(len(r.data.splitlines()), Book.query.count() + 1)
+
+    def test_background_bulk_action(self):
+        app.config['CSRF_ENABLED'] = False
+        try:
+            r = self.client.post(url_for('admin.job_book_bulk'),
+                data={'action': 'reset_year', 'all': '1'})
+        finally:
+            del app.config['CSRF_ENABLED']
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(Book.query.filter_by(year=2000).count(), 0)
+        self.runner.run_next()
+        self.assertEqual(Book.query.filter_by(year=2000).count(),
+            Book.query.count())
+
+    def test_failed_job(self):
+        @self.runner.task('fail')
+        def fail(context, message):
+            context.progress(0.5)
+            raise ValueError(message)
+
+        job_id = self.runner.submit('fail', 'oops')
+        self.runner.run_next()
+        job = self.runner.store.get(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('ValueError: oops', job['error'])
+        r = self.client.get(url_for('admin.bg_jobs_result', job_id=job_id))
+        self.assertEqual(r.status_code, 404)
+        r = self.client.get(url_for('admin.bg_jobs_list'))
+        self.assertIn('ValueError: oops', r.data)
+
+    def test_thread_workers(self):
+        runner = JobRunner(store=self.runner.store, workers=1,
+            poll_interval=0.01)
+        runner.admin = admin
+        done = threading.Event()
+
+        @runner.task('ping')
+        def ping(context):
+            done.set()
+            return 'pong'
+
+        job_id = runner.submit('ping')
+        self.assertTrue(done.wait(5))
+        runner.stop(5)
+        self.assertEqual(self.runner.store.get(job_id)['message'], 'pong')
+
+    def test_private_files(self):
+        r = self.client.get(url_for('admin.job_book_export', format='csv'))
+        self.runner.run_next()
+        job = self.runner.store.list()[0]
+        for path in (self.runner.store.path, job['result_path']):
+            self.assertEqual(os.stat(path).st_mode & 0777, 0600)
+
+    def test_default_store(self):
+        instance_path, app.instance_path = app.instance_path, self.tmp
+        try:
+            runner = JobRunner(admin, workers=0, url_prefix='/instance-jobs',
+                endpoint='instance_jobs')
+        finally:
+            app.instance_path = instance_path
+        self.assertEqual(os.path.dirname(runner.store.path), self.tmp)
+
+    def test_job_owner(self):
+        users = ['alice']
+        admin.permissions.identity = lambda: users[0]
+        try:
+            self.client.get(url_for('admin.job_book_export', format='csv'))
+            job = self.runner.store.list()[0]
+            self.assertEqual(job['owner'], 'alice')
+            self.assertEqual(job['module'], 'job_book')
+            self.runner.run_next()
+            r = self.client.get(url_for('admin.bg_jobs_result',
+                job_id=job['id']))
+            self.assertEqual(r.status_code, 200)
+            users[0] = 'bob'
+            r = self.client.get(url_for('admin.bg_jobs_list'))
+            self.assertNotIn(job['id'], r.data)
+            for endpoint in ('admin.bg_jobs_status', 'admin.bg_jobs_result'):
+                r = self.client.get(url_for(endpoint, job_id=job['id']))
+                self.assertEqual(r.status_code, 404)
+        finally:
+            admin.permissions.identity = None
+
+    def test_module_security(self):
+        allowed = [True]
+
+        @self.book_module.secure_endpoint('export')
+        def secure(view):
+            return allowed[0]
+
+        self.client.get(url_for('admin.job_book_export', format='csv'))
+        job = self.runner.store.list()[0]
+        self.runner.run_next()
+        r = self.client.get(url_for('admin.bg_jobs_list'))
+        self.assertIn(job['id'], r.data)
+        allowed[0] = False
+        r = self.client.get(url_for('admin.bg_jobs_list'))
+        self.assertNotIn(job['id'], r.data)
+        for endpoint in ('admin.bg_jobs_status', 'admin.bg_jobs_result'):
+            r = self.client.get(url_for(endpoint, job_id=job['id']))
+            self.assertEqual(r.status_code, 404)
+
+
+class QueryProfilingTest(BaseTest):
+
+    def create_app(self):
+        return app
+
+    def test_statements(self):
+        Profiler(engines=[db.get_engine(app)])
+        with app.test_request_context():
+            flask.g._dashed_profile = Profile()
+            Book.query.all()
+            Book.query.all()
+            profile = get_profile()
+        self.assertEqual(profile.query_count, 2)
+        self.assertEqual(profile.statements.values()[0][0], 2)
+        self.assertIn('sql;desc="2 queries"', profile.get_server_timing())
+
+
+class LazyModelAdminModuleTest(BaseTest):
+
+    class LazyBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.LazyBookModule,
+            '/lazy-book', 'lazy_book', 'lazy book module')
+        return app
+
+    def is_built(self, name):
+        return self.LazyBookModule in\
+            ModelAdminModule.__dict__[name]._values
+
+    def test_built_on_first_use(self):
+        self.assertFalse(self.is_built('form_class'))
+        self.assertEqual(self.book_module._views, {})
+        r = self.client.get(url_for('admin.lazy_book_new'))
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(self.is_built('form_class'))
+        self.assertEqual(self.book_module._views.keys(), ['new'])
+
+    def test_warm_up(self):
+        admin.warm_up()
+        self.assertTrue(self.is_built('form_class'))
+        self.assertTrue(self.is_built('_eager_loading'))
+        self.assertEqual(set(self.book_module._views),
+            set(self.book_module.rules))
+
+    def test_secure_unbuilt_endpoint(self):
+        self.book_module.secure_endpoint('list')(lambda view: False)
+        r = self.client.get(url_for('admin.lazy_book_list'))
+        self.assertEqual(r.status_code, 403)
+        r = self.client.get(url_for('admin.lazy_book_new'))
+        self.assertEqual(r.status_code, 200)
+
+
+class FormCacheTest(BaseTest):
+
+    class FormBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.FormBookModule,
+            '/form-book', 'form_book', 'form book module')
+        return app
+
+    def test_shared_form_class(self):
+        self.assertIs(self.FormBookModule.form_class,
+            AutoModelAdminModuleTest.AutoBookModule.form_class)
+        self.assertIsNot(self.FormBookModule.form_class,
+            LookupTest.LookupBookModule.form_class)
+
+    def test_model_form_class(self):
+        self.assertIsNot(model_form(Book, db.session),
+            model_form(Book, db.session))
+        self.assertIsNot(model_form(Book, db.session),
+            self.FormBookModule.form_class)
+
+    def test_post_form(self):
+        book = Book.query.first()
+        app.config['CSRF_ENABLED'] = False
+        try:
+            r = self.client.post(url_for('admin.form_book_edit', pk=book.id),
+                data={'title': u'new title', 'year': '1900',
+                    'author': str(book.author.id)})
+        finally:
+            del app.config['CSRF_ENABLED']
+        self.assertEqual(r.status_code, 302)
+        db.session.expire_all()
+        self.assertEqual(Book.query.get(book.id).title, u'new title')
+
+
+class LookupTest(BaseTest):
+
+    class LookupBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        lookup_fields = {'author': {'search': ['name'], 'label': 'name',
+            'per_page': 2}}
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.LookupBookModule,
+            '/lookup-book', 'lookup_book', 'lookup book module')
+        return app
+
+    def test_lookup(self):
+        r = self.client.get(url_for('admin.lookup_book_lookup',
+            field='author', q='Al'))
+        data = json.loads(r.data)
+        self.assertEqual([choice['label'] for choice in data['results']],
+            [u'Alain Fournier', u'Albert Camus'])
+        self.assertFalse(data['more'])
+        r = self.client.get(url_for('admin.lookup_book_lookup',
+            field='author'))
+        self.assertTrue(json.loads(r.data)['more'])
+        r = self.client.get(url_for('admin.lookup_book_lookup',
+            field='author', page=2))
+        self.assertEqual(len(json.loads(r.data)['results']), 1)
+
+    def test_unknown_lookup(self):
+        r = self.client.get(url_for('admin.lookup_book_lookup',
+            field='title'))
+        self.assertEqual(r.status_code, 404)
+
+    def test_form_security(self):
+        allowed = {'new': False, 'edit': True}
+
+        def secure(endpoint):
+            def function(view, pk=None):
+                return allowed[endpoint]
+            return function
+
+        for endpoint in allowed:
+            self.book_module.secure_endpoint(endpoint)(secure(endpoint))
+        url = url_for('admin.lookup_book_lookup', field='author')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        allowed['edit'] = False
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_typeahead_widget(self):
+        book = Book.query.first()
+        r = self.client.get(url_for('admin.lookup_book_edit', pk=book.id))
+        self.assertIn('data-lookup-url="/admin/lookup-book/lookup/author"',
+            r.data)
+        self.assertIn('value="Alain Fournier"', r.data)
+        self.assertNotIn('<option', r.data)
+
+    def test_submitted_pk(self):
+        book = Book.query.first()
+        camus = Author.query.filter_by(name=u'Albert Camus').one()
+        with app.test_request_context():
+            form = self.book_module.form_class(OrderedMultiDict((
+                ('title', u'title'), ('year', u'1900'),
+                ('author', unicode(camus.id)))), obj=book, csrf_enabled=False)
+            self.assertTrue(form.validate())
+            self.assertEqual(form.author.data, camus)
+            form = self.book_module.form_class(OrderedMultiDict((
+                ('title', u'title'), ('year', u'1900'), ('author', u'999'))),
+                obj=book, csrf_enabled=False)
+            self.assertFalse(form.validate())
+            self.assertIn('author', form.errors)
+
+
+class OptimisticLockingTest(BaseTest):
+
+    class HashBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        version_hash = True
+
+    class NoteModule(ModelAdminModule):
+        model = Note
+        db_session = db.session
+        version_column = 'version'
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.HashBookModule,
+            '/locked-book', 'locked_book', 'locked book module')
+        self.note_module = admin.register_module(self.NoteModule,
+            '/note', 'note', 'note module')
+        return app
+
+    def post(self, url, data):
+        app.config['CSRF_ENABLED'] = False
+        try:
+            return self.client.post(url, data=data)
+        finally:
+            del app.config['CSRF_ENABLED']
+
+    def get_version(self, url):
+        return re.search(r'name="_version" value="([^"]+)"',
+            self.client.get(url).data).group(1)
+
+    def test_hash_conflict(self):
+        book = Book.query.first()
+        url = url_for('admin.locked_book_edit', pk=book.id)
+        version = self.get_version(url)
+        data = {'title': u'mine', 'year': '1913', 'author': book.author.id,
+            '_version': version}
+        Book.query.filter_by(id=book.id).update({'title': u'theirs'})
+        db.session.commit()
+        r = self.post(url, data)
+        self.assertEqual(r.status_code, 409)
+        self.assertIn('<td>mine</td>', r.data)
+        self.assertIn('<td>theirs</td>', r.data)
+        db.session.expire_all()
+        self.assertEqual(Book.query.get(book.id).title, u'theirs')
+        data['_version'] = re.search(r'name="_version" value="([^"]+)"',
+            r.data).group(1)
+        r = self.post(url, data)
+        self.assertEqual(r.status_code, 302)
+        db.session.expire_all()
+        self.assertEqual(Book.query.get(book.id).title, u'mine')
+
+    def test_version_column(self):
+        note = Note(text=u'draft')
+        db.session.add(note)
+        db.session.commit()
+        url = url_for('admin.note_edit', pk=note.id)
+        self.assertNotIn('name="version"', self.client.get(url).data)
+        version = self.get_version(url)
+        r = self.post(url, {'text': u'first', '_version': version})
+        self.assertEqual(r.status_code, 302)
+        r = self.post(url, {'text': u'second', '_version': version})
+        self.assertEqual(r.status_code, 409)
+        db.session.expire_all()
+        note = Note.query.get(note.id)
+        self.assertEqual((note.text, note.version), (u'first', 1))
+
+    def test_missing_version(self):
+        note = Note(text=u'draft')
+        db.session.add(note)
+        db.session.commit()
+        url = url_for('admin.note_edit', pk=note.id)
+        version = self.get_version(url)
+        r = self.post(url, {'text': u'first'})
+        self.assertEqual(r.status_code, 409)
+        self.note_module.save_object(Note.query.get(note.id))
+        r = self.post(url, {'text': u'second', '_version': version})
+        self.assertEqual(r.status_code, 409)
+        db.session.expire_all()
+        self.assertEqual(Note.query.get(note.id).version, 1)
+
+    def test_bulk_update_version(self):
+        note = Note(text=u'draft')
+        db.session.add(note)
+        db.session.commit()
+        self.note_module.bulk_actions = OrderedMultiDict((
+            ('archive', {'label': 'archive', 'values': {'text': u'old'}}),))
+        try:
+            self.note_module.execute_bulk_action('archive', pks=[note.id])
+        finally:
+            del self.note_module.bulk_actions
+        db.session.expire_all()
+        note = Note.query.get(note.id)
+        self.assertEqual((note.text, note.version), (u'old', 1))
+
+    def test_new_object_is_not_versioned(self):
+        r = self.client.get(url_for('admin.note_new'))
+        self.assertNotIn('_version', r.data)
+        r = self.post(url_for('admin.note_new'), {'text': u'new'})
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(Note.query.one().version, 0)
+
+
+class ConditionalGetTest(BaseTest):
+
+    class ConditionalBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        conditional_get = True
+
+    class PlainBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.ConditionalBookModule,
+            '/cond-book', 'cond_book', 'conditional book module')
+        admin.register_module(self.PlainBookModule, '/plain-book',
+            'plain_book', 'plain book module')
+        return app
+
+    def assertNotModified(self, url):
+        r = self.client.get(url)
+        self.assert200(r)
+        etag = r.headers['ETag']
+        r = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r.headers['ETag'], etag)
+        return etag
+
+    def test_list_not_modified(self):
+        url = url_for('admin.cond_book_list')
+        self.assertNotModified(url)
+        self.assertIn('no-cache', self.client.get(url).headers[
+            'Cache-Control'])
+
+    def test_list_modified(self):
+        url = url_for('admin.cond_book_list')
+        etag = self.assertNotModified(url)
+        db.session.add(Book(title=u'Nouveau'))
+        db.session.commit()
+        self.assert200(self.client.get(url,
+            headers={'If-None-Match': etag}))
+        etag = self.assertNotModified(url)
+        Author.query.update({'name': u'Anonyme'})
+        db.session.commit()
+        self.assert200(self.client.get(url,
+            headers={'If-None-Match': etag}))
+
+    def test_rollback_keeps_version(self):
+        url = url_for('admin.cond_book_list')
+        etag = self.assertNotModified(url)
+        db.session.add(Book(title=u'Brouillon'))
+        db.session.flush()
+        db.session.rollback()
+        r = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 304)
+
+    def test_query_args(self):
+        url = url_for('admin.cond_book_list')
+        etag = self.assertNotModified(url)
+        r = self.client.get(url + '?search=Peste',
+            headers={'If-None-Match': etag})
+        self.assert200(r)
+
+    def test_edit_not_modified(self):
+        book = Book.query.first()
+        self.assertNotModified(url_for('admin.cond_book_edit', pk=book.id))
+
+    def test_unversioned(self):
+        r = self.client.get(url_for('admin.plain_book_list'))
+        self.assertNotIn('ETag', r.headers)
+        self.PlainBookModule.last_modified_column = 'year'
+        try:
+            r = self.client.get(url_for('admin.plain_book_list'))
+        finally:
+            del self.PlainBookModule.last_modified_column
+        self.assertNotIn('ETag', r.headers)
+        self.assertNotIn('Last-Modified', r.headers)
+
+    def test_if_modified_since_is_ignored(self):
+        r = self.client.get(url_for('admin.cond_book_list'),
+            headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+        self.assert200(r)
+
+
+class ListCacheTest(BaseTest):
+
+    class CachedBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        list_cache = LRUCache()
+        bulk_actions = OrderedMultiDict((
+            ('delete', {'label': 'delete', 'delete': True}),
+        ))
+        list_fields = OrderedMultiDict((
+            ('id', {'label': 'id', 'column': Book.id}),
+            ('title', {'label': 'title', 'column': Book.title}),
+            ('author.name', {'label': 'author', 'column': Author.name}),
+        ))
+
+    class AuthorModule(ModelAdminModule):
+        model = Author
+        db_session = db.session
+
+    def create_app(self):
+        # Fixtures are created out of admin modules
+        self.CachedBookModule.list_cache.clear()
+        self.book_module = admin.register_module(self.CachedBookModule,
+            '/cached-book', 'cached_book', 'cached book module')
+        self.author_module = admin.register_module(self.AuthorModule,
+            '/cached-author', 'cached_author', 'cached author module')
+        return app
+
+    def rename_book(self, title):
+        # Out of sessions so that changes aren't counted
+        book = Book.query.order_by(Book.id).first()
+        db.engine.execute(Book.__table__.update().where(Book.id == book.id)
+            .values(title=title))
+        db.session.expire(book)
+        return book
+
+    def test_cached(self):
+        url = url_for('admin.cached_book_list')
+        self.assertIn('Le grand Meaulnes', self.client.get(url).data)
+        self.rename_book(u'Renamed')
+        self.assertIn('Le grand Meaulnes', self.client.get(url).data)
+        self.assertIn('Renamed', self.client.get(url + '?search=Renamed')
+            .data)
+
+    def test_save_invalidates(self):
+        url = url_for('admin.cached_book_list')
+        self.client.get(url)
+        book = self.rename_book(u'Renamed')
+        self.book_module.save_object(book)
+        self.assertIn('Renamed', self.client.get(url).data)
+
+    def test_related_save_invalidates(self):
+        url = url_for('admin.cached_book_list')
+        self.client.get(url)
+        author = Author.query.filter_by(name=u'Alain Fournier').one()
+        author.name = u'Henri-Alban Fournier'
+        self.author_module.save_object(author)
+        self.assertIn('Henri-Alban Fournier', self.client.get(url).data)
+
+    def test_bulk_action_invalidates(self):
+        url = url_for('admin.cached_book_list')
+        self.client.get(url)
+        book = Book.query.order_by(Book.id).first()
+        self.book_module.execute_bulk_action('delete', pks=[book.id])
+        self.assertNotIn('Le grand Meaulnes', self.client.get(url).data)
+
+    def test_shared_cache_invalidates(self):
+        # Another process sharing list cache, with its own tables counters
+        other_module = admin.register_module(type('OtherBookModule',
+            (self.CachedBookModule,), {'table_versions': TableVersions()}),
+            '/other-cached-book', 'other_cached_book', 'other book module')
+        url = url_for('admin.cached_book_list')
+        self.client.get(url)
+        book = self.rename_book(u'Renamed')
+        other_module.save_object(book)
+        self.assertIn('Renamed', self.client.get(url).data)
+
+
+class ListProjectionTest(BaseTest):
+
+    class ProjectedBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        list_projection = True
+        searchable_fields = ['title']
+        list_fields = OrderedMultiDict((
+            ('title', {'label': 'title', 'column': Book.title}),
+            ('author.name', {'label': 'author', 'column': Author.name}),
+        ))
+
+    class PropertyBookModule(ProjectedBookModule):
+        list_fields = OrderedMultiDict((
+            ('title', {'label': 'title', 'column': Book.title}),
+            ('author', {'label': 'author'}),
+            ('author.books', {'label': 'books'}),
+        ))
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.ProjectedBookModule,
+            '/projected-book', 'projected_book', 'projected book module')
+        return app
+
+    def test_projection(self):
+        self.assertEqual(self.ProjectedBookModule._list_projection, {
+            (): ['author_id', 'id', 'title'],
+            ('author',): ['id', 'name'],
+        })
+        self.assertEqual(self.PropertyBookModule._list_projection, {
+            (): ['author_id', 'id', 'title'],
+        })
+
+    def test_deferred_columns(self):
+        book = self.book_module.get_object_list()[0]
+        unloaded = sqlalchemy.inspect(book).unloaded
+        self.assertIn('year', unloaded)
+        self.assertNotIn('title', unloaded)
+        self.assertNotIn('author', unloaded)
+        self.assertNotIn('name', sqlalchemy.inspect(book.author).unloaded)
+
+    def test_list(self):
+        book = Book.query.filter_by(title=u'La Peste').one()
+        r = self.client.get(url_for('admin.projected_book_list',
+            search=u'Peste', orderby='title', orderdir='asc'))
+        self.assert200(r)
+        self.assertIn(url_for('admin.projected_book_edit', pk=book.id),
+            r.data.decode('utf-8'))
+
+
+replica_engine = sqlalchemy.create_engine('sqlite:////tmp/test_replica.db')
+ReplicaSession = orm.scoped_session(orm.sessionmaker(bind=replica_engine))
+
+
+class ReadReplicaTest(BaseTest):
+
+    class ReplicaBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        read_session = ReplicaSession
+        searchable_fields = ['title']
+        list_fields = OrderedMultiDict((
+            ('id', {'label': 'id', 'column': Book.id}),
+            ('title', {'label': 'title', 'column': Book.title}),
+        ))
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.ReplicaBookModule,
+            '/replica-book', 'replica_book', 'replica book module')
+        return app
+
+    def setUp(self):
+        super(ReadReplicaTest, self).setUp()
+        db.metadata.create_all(replica_engine)
+        replica_engine.execute(Book.__table__.insert(),
+            title=u'Replica book')
+
+    def tearDown(self):
+        ReplicaSession.remove()
+        db.metadata.drop_all(replica_engine)
+        super(ReadReplicaTest, self).tearDown()
+
+    def test_reads(self):
+        self.assertEqual(self.book_module.count_list(), 1)
+        r = self.client.get(url_for('admin.replica_book_list'))
+        self.assertIn('Replica book', r.data)
+        self.assertNotIn('Caligula', r.data)
+
+    def test_edit_from_primary(self):
+        book = Book.query.filter_by(title=u'Caligula').one()
+        r = self.client.get(url_for('admin.replica_book_edit', pk=book.id))
+        self.assert200(r)
+        self.assertIn('Caligula', r.data)
+
+    def test_read_your_writes(self):
+        book = Book.query.filter_by(title=u'Caligula').one()
+        app.config['CSRF_ENABLED'] = False
+        try:
+            r = self.client.post(url_for('admin.replica_book_edit',
+                pk=book.id), data={'title': u'Caligula (1944)',
+                'year': '1944', 'author': book.author_id})
+        finally:
+            del app.config['CSRF_ENABLED']
+        self.assertEqual(r.status_code, 302)
+        r = self.client.get(url_for('admin.replica_book_list',
+            search=u'Caligula'))
+        self.assertIn('Caligula (1944)', r.data)
+
+
+uow_admin = Admin(app, url_prefix='/uow-admin', endpoint='uow_admin')
+uow_stats = []
+UnitOfWork(uow_admin, engines=[db.get_engine(app)],
+    on_stats=uow_stats.append)
+
+
+class UnitOfWorkTest(BaseTest):
+
+    class UnitOfWorkBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+
+    class WritingBookModule(UnitOfWorkBookModule):
+        def get_list_count(self, search=None):
+            db.session.add(Note(text=u'written while listing'))
+            db.session.flush()
+            return super(UnitOfWorkTest.WritingBookModule,
+                self).get_list_count(search)
+
+    def create_app(self):
+        self.book_module = uow_admin.register_module(
+            self.UnitOfWorkBookModule, '/book', 'book', 'book module')
+        uow_admin.register_module(self.WritingBookModule, '/writing-book',
+            'writing_book', 'writing book module')
+        del uow_stats[:]
+        return app
+
+    def test_read_only_list(self):
+        self.assert200(self.client.get(url_for('uow_admin.book_list')))
+        stats = uow_stats[-1]
+        self.assertEqual(stats['endpoint'], 'uow_admin.book_list')
+        self.assertTrue(stats['read_only'])
+        self.assertEqual(stats['sessions'], 1)
+        self.assertTrue(stats['checkouts'] >= 1)
+        self.assertIn('class', stats['pools'][0])
+
+    def test_read_only_refuses_flush(self):
+        try:
+            r = self.client.get(url_for('uow_admin.writing_book_list'))
+        except Exception, e:
+            self.assertIn('must not write', str(e))
+        else:
+            self.assertEqual(r.status_code, 500)
+        db.session.rollback()
+        self.assertEqual(Note.query.count(), 0)
+
+    def test_write(self):
+        book = Book.query.filter_by(title=u'Caligula').one()
+        app.config['CSRF_ENABLED'] = False
+        try:
+            r = self.client.post(url_for('uow_admin.book_edit', pk=book.id),
+                data={'title': u'Caligula (1944)', 'year': '1944',
+                'author': book.author_id})
+        finally:
+            del app.config['CSRF_ENABLED']
+        self.assertEqual(r.status_code, 302)
+        self.assertFalse(uow_stats[-1]['read_only'])
+        self.assertEqual(Book.query.filter_by(title=u'Caligula (1944)')
+            .count(), 1)
+
+    def test_unused_session(self):
+        db.session.remove()
+        self.client.get(url_for('uow_admin.main-dashboard_show'))
+        self.assertEqual(uow_stats[-1]['sessions'], 0)
+        self.assertEqual(uow_stats[-1]['checkouts'], 0)
+
+
+class EagerLoadingTest(BaseTest):
+
+    class JoinedBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        list_fields = OrderedMultiDict((
+            ('title', {'label': 'title', 'column': Book.title}),
+            ('author.name', {'label': 'author name'}),
+        ))
+
+    class ContainsBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        list_fields = OrderedMultiDict((
+            ('title', {'label': 'title', 'column': Book.title}),
+            ('author.name', {'label': 'author name', 'column': Author.name}),
+        ))
+        searchable_fields = ['author.name']
+        order_by = ('author.name', 'asc')
+
+    class AuthorModule(ModelAdminModule):
+        model = Author
+        db_session = db.session
+        list_fields = OrderedMultiDict((
+            ('name', {'label': 'name', 'column': Author.name}),
+            ('books.title', {'label': 'books'}),
+        ))
+
+    class FactoryJoinedBookModule(ContainsBookModule):
+
+        @property
+        def list_query_factory(self):
+            return Book.query.outerjoin(Author, Book.author)\
+                .options(contains_eager(Book.author))
+
+    def create_app(self):
+        self.joined_module = admin.register_module(self.JoinedBookModule,
+            '/joined-book', 'joined_book', 'joined book module')
+        self.contains_module = admin.register_module(
+            self.ContainsBookModule, '/contains-book', 'contains_book',
+            'contains book module')
+        self.author_module = admin.register_module(self.AuthorModule,
+            '/eager-author', 'eager_author', 'eager author module')
+        self.factory_module = admin.register_module(
+            self.FactoryJoinedBookModule, '/factory-book', 'factory_book',
+            'factory joined book module')
+        return app
+
+    def test_plan(self):
+        self.assertEqual(self.joined_module._eager_loading,
+            [(('author',), 'joined')])
+        self.assertEqual(self.contains_module._eager_loading,
+            [(('author',), 'contains')])
+        self.assertEqual(self.author_module._eager_loading[0][0],
+            ('books',))
+        self.assertEqual(ExplicitModelAdminModuleTest.BookModule
+            ._plan_eager_loading(), [])
+
+    def test_relationships_are_loaded(self):
+        db.session.expunge_all()
+        for module, attribute in ((self.joined_module, 'author'),
+                (self.contains_module, 'author'),
+                (self.author_module, 'books')):
+            for obj in module.get_object_list():
+                self.assertIn(attribute, obj.__dict__)
+
+    def test_search_and_order_by_related_column(self):
+        self.assertEqual(self.contains_module.count_list(search=u'Camus'),
+            14)
+        objects = self.contains_module.get_object_list(limit=100)
+        self.assertEqual([o.author.name for o in objects],
+            sorted(o.author.name for o in objects))
+
+    def test_factory_joined_entity(self):
+        self.assertEqual(self.factory_module.count_list(search=u'Camus'), 14)
+        objects = self.factory_module.get_object_list(limit=100)
+        self.assertEqual([o.author.name for o in objects],
+            sorted(o.author.name for o in objects))
+        r = self.client.get(url_for('admin.factory_book_list'))
+        self.assertEqual(r.status_code, 200)
+
+
+class SearchStrategyTest(BaseTest):
+
+    class SearchBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        searchable_fields = ['title']
+
+    def create_app(self):
+        self.modules = {}
+        for name, strategy in (('prefix', PrefixSearch()),
+                ('tokenized', TokenizedSearch()),
+                ('fulltext', SQLiteFullTextSearch())):
+            module_class = type('%sBookModule' % name,
+                (self.SearchBookModule,), {'search_strategy': strategy})
+            self.modules[name] = admin.register_module(module_class,
+                '/%s-search-book' % name, '%s_search_book' % name,
+                '%s search book module' % name)
+        return app
+
+    def test_prefix_search(self):
+        self.assertEqual(self.modules['prefix'].count_list(search=u'Le'), 9)
+        self.assertEqual(self.modules['prefix'].count_list(search=u'ttres'),
+            0)
+        self.assertEqual(self.modules['prefix'].count_list(search=u'L_'), 0)
+
+    def test_tokenized_search(self):
+        self.assertEqual(
+            self.modules['tokenized'].count_list(search=u'famille lettres'),
+            1)
+
+    def test_sqlite_full_text_search(self):
+        module = self.modules['fulltext']
+        self.assertEqual(module.count_list(search=u'haschisch'), 2)
+        self.assertEqual(module.count_list(search=u'lett'), 2)
+        self.assertEqual(module.count_list(search=u'fleurs mal'), 1)
+        book = Book.query.filter_by(title=u'Noces').one()
+        book.title = u'Noces à Tipasa'
+        db.session.commit()
+        self.assertEqual(module.count_list(search=u'tipasa'), 1)
+        self.assertEqual(len(module.get_object_list(search=u'tipasa')), 1)
+
+    def test_postgres_ddl(self):
+        module_class = self.modules['tokenized'].__class__
+        self.assertEqual(PostgresFullTextSearch().ddl(module_class), [
+            "CREATE INDEX IF NOT EXISTS ix_book_fts ON book USING gin "
+            "(to_tsvector('simple', coalesce(title, '')))"])
+
+
+class KeysetModelAdminModuleTest(BaseTest):
+
+    class KeysetBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        list_pagination = 'keyset'
+        order_by = ('year', 'desc')
+
+    def create_app(self):
+        self.book_module = admin.register_module(self.KeysetBookModule,
+            '/keyset-book', 'keyset_book', 'keyset paginated book module')
+        return app
+
+    def test_walk_pages(self):
+        expected = Book.query.order_by(Book.year.desc(), Book.id.desc()).all()
+        objects, after = [], None
+        while True:
+            page = self.book_module.get_object_list(after=after)
+            if not page:
+                break
+            objects.extend(page)
+            after = page[-1].id
+        self.assertEqual(objects, expected)
+
+    def test_previous_page(self):
+        first = self.book_module.get_object_list()
+        second = self.book_module.get_object_list(after=first[-1].id)
+        self.assertEqual(
+            self.book_module.get_object_list(before=second[0].id),
+            first
+        )
+
+    def test_list_view_links(self):
+        r = self.client.get(url_for('admin.keyset_book_list'))
+        self.assertEqual(r.status_code, 200)
+        last = self.book_module.get_object_list()[-1]
+        self.assertIn('after=%s' % last.id, r.data)
+        self.assertNotIn('before=', r.data)
+        r = self.client.get(url_for('admin.keyset_book_list', after=last.id))
+        self.assertEqual(r.status_code, 200)
+        self.assertIn('before=', r.data)
+
+
+class CountStrategyTest(BaseTest):
+
+    class CachedCountBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        list_count = CachedCount(timeout=60)
+
+    class EstimatedCountBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        list_count = EstimatedCount()
+
+    class UncountedBookModule(ModelAdminModule):
+        model = Book
+        db_session = db.session
+        list_count = NoCount()
+
+    def create_app(self):
+        self.cached_module = admin.register_module(
+            self.CachedCountBookModule, '/cached-count-book',
+            'cached_count_book', 'cached count book module')
+        self.estimated_module = admin.register_module(
+            self.EstimatedCountBookModule, '/estimated-count-book',
+            'estimated_count_book', 'estimated count book module')
+        self.uncounted_module = admin.register_module(
+            self.UncountedBookModule, '/uncounted-book', 'uncounted_book',
+            'uncounted book module')
+        return app
+
+    def test_cached_count(self):
+        total = Book.query.count()
+        self.assertEqual(self.cached_module.get_list_count(), total)
+        db.session.add(Book(title=u"Carnets"))
+        db.session.commit()
+        self.assertEqual(self.cached_module.get_list_count(), total)
+        self.assertEqual(self.cached_module.get_list_count(search=u'x'),
+            total + 1)
+
+    def test_estimated_count(self):
+        self.assertEqual(self.estimated_module.get_list_count(),
+            Book.query.count())
+        r = self.client.get(url_for('admin.estimated_count_book_list'))
+        self.assertIn('~%s' % Book.query.count(), r.data)
+
+    def test_uncounted_list_view(self):
+        r = self.client.get(url_for('admin.uncounted_book_list'))
+        self.assertEqual(r.status_code, 200)
+        self.assertIn(url_for('admin.uncounted_book_listpaged', page=2),
+            r.data)
+        last_page = (Book.query.count() - 1) // \
+            self.uncounted_module.list_per_page + 1
+        r = self.client.get(url_for('admin.uncounted_book_listpaged',
+            page=last_page))
+        self.assertEqual(r.status_code, 200)
+        self.assertIn(url_for('admin.uncounted_book_listpaged',
+            page=last_page - 1), r.data)
+        self.assertNotIn(url_for('admin.uncounted_book_listpaged',
+            page=last_page + 1), r.data)
+
 
 if __name__ == '__main__':
     unittest.main()